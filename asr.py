@@ -1,10 +1,60 @@
-from faster_whisper import WhisperModel
-from silero_vad import load_silero_vad, read_audio, get_speech_timestamps
+from faster_whisper import WhisperModel, BatchedInferencePipeline
+from silero_vad import load_silero_vad, get_speech_timestamps
 import json
+import logging
 import os
+import subprocess
 import sys
 import argparse
-from pydub import AudioSegment
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+import torch
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # orjson未安装时回退到标准库json
+
+logger = logging.getLogger(__name__)
+
+# Constant across all files processed by this repo; hoisted to module level
+# so it is built once instead of per perform_asr call
+_ICT_INITIAL_PROMPT = '''
+This is an educational video about ICT (Inner Circle Trader) trading strategy and concepts in English.
+Please pay special attention to the following trading terminology and transcribe them accurately:
+
+Core ICT Trading Terms:
+- AMD (Accumulation, Manipulation, Distribution), PO3 (Power of Three)
+- BISI (Buy Side Imbalance Sell Side Inefficiency), SIBI (Sell Side Imbalance Buy Side Inefficiency)
+- BPR (Balanced Price Range), BSL (Buy Side Liquidity), SSL (Sell Side Liquidity)
+- BE (Breakeven), BOS (Break of Structure), CE (Consequent Encroachment)
+- FVG (Fair Value Gap), IFVG (Inversion Fair Value Gap)
+- HTF (Higher Time Frame), LTF (Lower Time Frame), IPDA (Inter Bank Price Delivery Algorithm)
+- STH (Short Term High), ITH (Intermediate Term High), LTH (Long Term High)
+- STL (Short Term Low), ITL (Intermediate Term Low), LTL (Long Term Low)
+- MSS (Market Structure Shift), MT (Mean Threshold), OB (Order Block)
+- OTE (Optimal Trade Entry), PDL (Previous Day Low), PDH (Previous Day High)
+- ERL (External Range Liquidity), IRL (Internal Range Liquidity), PD Array (Premium & Discount Array)
+- BB (Breaker Block), MB (Mitigation Block), NWOG (New Week Opening Gap)
+- LP (Liquidity Pool), TGIF (Thanks God It's Friday)
+
+Traditional Trading Terms:
+- Silver Bullet, Lot, Spread, Margin, Leverage, Bid, Ask, Swap
+- Forex, Long, Short, Stop Loss, Take Profit, pip, pips, handle, handles, tick, ticks, point, points
+- Draw on liquidity, liquidity pools, bear order block, bull order block, equal low (EQL), equal high (EQH)
+- session, liquidity, probability, smart money, liquidity raid, stop hunt
+- retail, institutional, price, up close candle
+
+Key Concepts:
+- ICT methodology, market structure, price action, smart money concepts
+- Supply and demand zones, market makers, liquidity analysis, order flow
+- Trading psychology, risk management, trade execution
+- Premium and discount, price delivery algorithm, market structure shifts
+
+Please ensure accurate transcription of these specific ICT terms and concepts as they are crucial for the educational content.
+    '''
 
 
 def get_default_output_path(input_file_path, file_type='asr'):
@@ -43,12 +93,126 @@ def get_default_output_path(input_file_path, file_type='asr'):
             return os.path.join(input_dir, f'{input_name}_audio_segments')
 
 
-def perform_asr(audio_file_path):
+def _decode_audio_s16(media_file_path):
+    """
+    Decode an audio or video file to 16kHz mono int16 PCM via one ffmpeg pipe.
+
+    Args:
+        media_file_path (str): Path to the input audio or video file
+
+    Returns:
+        np.ndarray: int16 waveform at 16kHz mono
+    """
+    proc = subprocess.run([
+        'ffmpeg', '-i', media_file_path,
+        '-vn', '-f', 's16le', '-ar', '16000', '-ac', '1', '-'
+    ], check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    return np.frombuffer(proc.stdout, np.int16)
+
+
+def _decode_to_16k_mono(media_file_path):
+    """
+    Decode an audio or video file to 16kHz mono float32 PCM exactly once.
+
+    Every stage of the pipeline (VAD, ASR, segment slicing) wants the same
+    16kHz mono representation, so the decoded waveform is persisted as a
+    float32 memmap next to the input. The first call decodes through the
+    ffmpeg pipe and writes the buffer; later calls — including calls from
+    other stages in the same run — just mmap it, and the OS page cache
+    absorbs the repeated reads.
+
+    The sidecar is only trusted while it is at least as new as the source:
+    re-running noise reduction regenerates denoised.wav in place, and a
+    bare existence check would keep transcribing the stale buffer. The
+    buffer is written to a .tmp file and moved into place atomically so an
+    interrupted decode never leaves a half-written sidecar that passes the
+    freshness check.
+
+    Args:
+        media_file_path (str): Path to the input audio or video file
+
+    Returns:
+        np.memmap: float32 waveform at 16kHz mono, scaled to [-1, 1]
+    """
+    cache_path = media_file_path + '.f32'
+
+    try:
+        cache_fresh = os.path.getmtime(cache_path) >= os.path.getmtime(media_file_path)
+    except OSError:
+        cache_fresh = False
+
+    if not cache_fresh:
+        pcm = _decode_audio_s16(media_file_path).astype(np.float32) / 32768.0
+        tmp_path = cache_path + '.tmp'
+        buffer = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=pcm.shape)
+        buffer[:] = pcm
+        buffer.flush()
+        del buffer
+        os.replace(tmp_path, cache_path)
+
+    return np.memmap(cache_path, dtype=np.float32, mode='r')
+
+
+@lru_cache(maxsize=1)
+def get_vad_model():
+    """
+    Load the silero VAD model once and reuse it across invocations.
+
+    The model is moved to GPU when available so the per-window LSTM runs
+    on device instead of in a CPU loop.
+
+    Returns:
+        The cached silero VAD model
+    """
+    vad_model = load_silero_vad()
+    if torch.cuda.is_available():
+        vad_model.to("cuda")
+    return vad_model
+
+
+@lru_cache(maxsize=1)
+def get_asr_model(model_size="large", compute_type="int8_float16"):
+    """
+    Load the Whisper model once and reuse it across invocations.
+
+    The large model takes seconds to load, which dominates small-file
+    latency when processing several files in one process. A warmup pass
+    on one second of silence primes the cuDNN/cuBLAS kernel selection
+    before the first real transcription.
+
+    Args:
+        model_size (str): Whisper model size (default: 'large')
+        compute_type (str): CTranslate2 compute type
+
+    Returns:
+        WhisperModel: The cached Whisper model
+    """
+    # num_workers>1 gives ctranslate2 one CUDA stream per worker so
+    # concurrent transcribe calls overlap instead of queueing on one stream
+    asr_model = WhisperModel(model_size, device="auto", compute_type=compute_type,
+                             num_workers=2, cpu_threads=4)
+
+    # Warmup: run a 1-second dummy clip so kernel tactics are picked now
+    warmup_segments, _ = asr_model.transcribe(np.zeros(16000, dtype=np.float32), language="en")
+    for _ in warmup_segments:
+        pass
+
+    return asr_model
+
+
+def perform_asr(audio_file_path, compute_type="int8_float16", beam_size=1):
     """
     Perform Automatic Speech Recognition on an audio file.
 
     Args:
         audio_file_path (str): Path to the input audio file
+        compute_type (str): CTranslate2 compute type for the Whisper model
+                            (default: 'int8_float16', INT8 weights with FP16 compute)
+        beam_size (int): Decoder beam width (default: 1, greedy decoding;
+                         note the batched pipeline decodes each segment once
+                         and does not retry pathological segments at higher
+                         temperatures the way the plain API does)
 
     Returns:
         dict: ASR results with segments information
@@ -57,91 +221,103 @@ def perform_asr(audio_file_path):
 
     # Step 1: VAD
     print("Step 1: Performing Voice Activity Detection...")
-    vad_model = load_silero_vad()
+    vad_model = get_vad_model()
+
+    # Decode the waveform once into the shared 16kHz mono memmap; the same
+    # buffer is reused by the VAD, by faster-whisper below and by the
+    # segment extraction step, so nothing re-decodes the file
+    pcm = _decode_to_16k_mono(audio_file_path)
+
+    # Stream the whole waveform through the VAD on GPU instead of
+    # feeding 32ms windows from a Python loop on CPU
+    wav = torch.from_numpy(np.asarray(pcm))
+    if torch.cuda.is_available():
+        wav = wav.to("cuda")
 
     speech_timestamps = get_speech_timestamps(
-        read_audio(audio_file_path),
+        wav,
         vad_model,
         min_silence_duration_ms=2000,
-        return_seconds=True,
     )
     print(f"Found {len(speech_timestamps)} speech segments")
 
+    # No speech at all (music-only or silent input) is a valid outcome, but
+    # the batched pipeline raises on an empty clip list instead of falling
+    # back to whole-file transcription the way WhisperModel.transcribe does
+    if not speech_timestamps:
+        print("No speech detected, skipping transcription")
+        return {'total_segments': 0, 'segments': []}, audio_file_path
+
+    # Keep the VAD boundaries as silero's native integer sample indices;
+    # converting to float seconds per segment and back again is pure churn
+    speech_samples = np.asarray([[ts['start'], ts['end']] for ts in speech_timestamps],
+                                dtype=np.int64)
+
     # Step 2: ASR
     print("Step 2: Performing Automatic Speech Recognition...")
     model_size = "large"
-    asr_model = WhisperModel(model_size, device="auto", compute_type="float16")
-
-    initial_prompt = '''
-This is an educational video about ICT (Inner Circle Trader) trading strategy and concepts in English.
-Please pay special attention to the following trading terminology and transcribe them accurately:
-
-Core ICT Trading Terms:
-- AMD (Accumulation, Manipulation, Distribution), PO3 (Power of Three)
-- BISI (Buy Side Imbalance Sell Side Inefficiency), SIBI (Sell Side Imbalance Buy Side Inefficiency)
-- BPR (Balanced Price Range), BSL (Buy Side Liquidity), SSL (Sell Side Liquidity)
-- BE (Breakeven), BOS (Break of Structure), CE (Consequent Encroachment)
-- FVG (Fair Value Gap), IFVG (Inversion Fair Value Gap)
-- HTF (Higher Time Frame), LTF (Lower Time Frame), IPDA (Inter Bank Price Delivery Algorithm)
-- STH (Short Term High), ITH (Intermediate Term High), LTH (Long Term High)
-- STL (Short Term Low), ITL (Intermediate Term Low), LTL (Long Term Low)
-- MSS (Market Structure Shift), MT (Mean Threshold), OB (Order Block)
-- OTE (Optimal Trade Entry), PDL (Previous Day Low), PDH (Previous Day High)
-- ERL (External Range Liquidity), IRL (Internal Range Liquidity), PD Array (Premium & Discount Array)
-- BB (Breaker Block), MB (Mitigation Block), NWOG (New Week Opening Gap)
-- LP (Liquidity Pool), TGIF (Thanks God It's Friday)
-
-Traditional Trading Terms:
-- Silver Bullet, Lot, Spread, Margin, Leverage, Bid, Ask, Swap
-- Forex, Long, Short, Stop Loss, Take Profit, pip, pips, handle, handles, tick, ticks, point, points
-- Draw on liquidity, liquidity pools, bear order block, bull order block, equal low (EQL), equal high (EQH)
-- session, liquidity, probability, smart money, liquidity raid, stop hunt
-- retail, institutional, price, up close candle
-
-Key Concepts:
-- ICT methodology, market structure, price action, smart money concepts
-- Supply and demand zones, market makers, liquidity analysis, order flow
-- Trading psychology, risk management, trade execution
-- Premium and discount, price delivery algorithm, market structure shifts
-
-Please ensure accurate transcription of these specific ICT terms and concepts as they are crucial for the educational content.
-    '''
-
-    # Convert speech_timestamps to clip_timestamps format
-    clip_timestamps = []
-    for timestamp in speech_timestamps:
-        clip_timestamps.extend([timestamp["start"], timestamp["end"]])
-
-    segments, _ = asr_model.transcribe(audio_file_path, beam_size=5, language="en",
-                                       multilingual=False,
-                                     initial_prompt=initial_prompt, clip_timestamps=clip_timestamps)
-
+    asr_model = get_asr_model(model_size, compute_type)
+
+    # BatchedInferencePipeline.transcribe wants clip_timestamps as a list of
+    # {'start', 'end'} dicts in seconds (it rescales each dict back to sample
+    # indices itself); the flat-seconds form is only valid for the plain
+    # WhisperModel.transcribe API
+    clip_timestamps = [{'start': start / 16000.0, 'end': end / 16000.0}
+                       for start, end in speech_samples]
+
+    # Batch the VAD-bounded utterances through the encoder/decoder as one GPU
+    # batch instead of transcribing the clips sequentially
+    batched_pipeline = BatchedInferencePipeline(model=asr_model)
+    # language + task pinned explicitly so the language-detection encoder
+    # pass is skipped; condition_on_previous_text=False keeps the decoder
+    # context (and its KV cache) small on long-form audio
+    segments, _ = batched_pipeline.transcribe(np.asarray(pcm), batch_size=16,
+                                              vad_filter=False,
+                                              beam_size=beam_size, language="en",
+                                              task="transcribe",
+                                              multilingual=False,
+                                              condition_on_previous_text=False,
+                                              # scalar: the batched pipeline only ever
+                                              # samples at the first temperature and has
+                                              # no low-logprob/high-compression retry, so
+                                              # a fallback ladder would be dead weight
+                                              temperature=0.0,
+                                              compression_ratio_threshold=2.4,
+                                              log_prob_threshold=-1.0,
+                                              # the batched path tokenizes initial_prompt
+                                              # itself and only accepts a string;
+                                              # pre-tokenized ids are a plain
+                                              # WhisperModel.transcribe feature
+                                              initial_prompt=" " + _ICT_INITIAL_PROMPT.strip(),
+                                              clip_timestamps=clip_timestamps)
+
+    # Stream the transcription generator through a one-segment merge window
+    # instead of materializing every raw segment up front: a segment is
+    # finalized as soon as the next one arrives with a gap >= 5ms, so peak
+    # memory holds only the pending segment plus the (much smaller) merged
+    # list, and merging overlaps with GPU decoding
     asr_segments = []
+    pending = None
+    raw_count = 0
+
+    for segment in segments:
+        raw_count += 1
+        start_ms = round(segment.start * 1000)
+        end_ms = round(segment.end * 1000)
+        text = segment.text.strip()
+
+        if pending is not None and start_ms - pending['end'] < 5:
+            pending['end'] = end_ms
+            pending['text'] += ' ' + text
+        else:
+            if pending is not None:
+                asr_segments.append(pending)
+            pending = {'start': start_ms, 'end': end_ms, 'text': text}
 
+    if pending is not None:
+        asr_segments.append(pending)
 
-    for i, segment in enumerate(segments):
-        current_segment = {
-            'start': round(segment.start * 1000),
-            'end': round(segment.end * 1000),
-            'text': segment.text.strip()
-        }
-
-        # Check if we should merge with previous segment
-        if i > 0 and asr_segments:
-            previous_segment = asr_segments[-1]
-            gap = current_segment['start'] - previous_segment['end']
-
-            # If gap is less than 5ms, merge current segment into previous one
-            if gap < 5:
-                previous_segment['end'] = current_segment['end']
-                previous_segment['text'] += ' ' + current_segment['text']
-                print(f"segment {i}: Merged with previous segment (gap: {gap}ms)")
-            else:
-                asr_segments.append(current_segment)
-                print(f"segment {i}: {segment.text}")
-        else:
-            asr_segments.append(current_segment)
-            print(f"segment {i}: {segment.text}")
+    print(f"Merged {raw_count} raw segments into {len(asr_segments)} segments")
 
     # Prepare ASR results
     asr_results = {
@@ -167,8 +343,9 @@ def extract_audio_segments(media_file_path, asr_results_path, output_dir='audio_
 
     # Load ASR results
     try:
-        with open(asr_results_path, 'r', encoding='utf-8') as f:
-            asr_data = json.load(f)
+        with open(asr_results_path, 'rb') as f:
+            raw = f.read()
+        asr_data = orjson.loads(raw) if orjson is not None else json.loads(raw)
         segments = asr_data['segments']
         print(f"Loaded {len(segments)} segments from {asr_results_path}")
     except Exception as e:
@@ -179,44 +356,42 @@ def extract_audio_segments(media_file_path, asr_results_path, output_dir='audio_
     os.makedirs(output_dir, exist_ok=True)
     print(f"Output directory: {output_dir}")
 
-    # Load audio/video file
-    try:
-        audio = AudioSegment.from_file(media_file_path)
-        print(f"Loaded media file: {media_file_path}")
-    except Exception as e:
-        print(f"Failed to load media file: {e}")
-        return False
-
     total_segments = len(segments)
     success_count = 0
     error_count = 0
 
     print(f"Processing {total_segments} audio segments...")
 
-    # Extract each segment
+    # Reuse the shared 16kHz mono memmap; when ASR ran first in the same
+    # process the buffer is already on disk and this is a pure mmap, with
+    # no re-decode at all
+    try:
+        pcm = _decode_to_16k_mono(media_file_path)
+        print(f"Loaded 16kHz mono buffer for: {media_file_path}")
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Failed to decode media file: {e}")
+        return False
+
     for i, segment in enumerate(segments):
         segment_index = i + 1
-        try:
-            # Time is already in milliseconds
-            start_ms = int(segment['start'])
-            end_ms = int(segment['end'])
-
-            # Extract segment
-            audio_segment = audio[start_ms:end_ms]
+        start_ms = int(segment['start'])
+        end_ms = int(segment['end'])
 
-            # Create output filename
-            output_filename = f"segment_{segment_index:03d}_{start_ms}-{end_ms}.wav"
-            output_path = os.path.join(output_dir, output_filename)
+        output_filename = f"segment_{segment_index:03d}_{start_ms}-{end_ms}.wav"
+        output_path = os.path.join(output_dir, output_filename)
 
-            # Export segment
-            audio_segment.export(output_path, format="wav", parameters=["-ar", "16000", "-ac", "1"])
+        # 16kHz mono: 16 samples per millisecond
+        start_sample = start_ms * 16
+        end_sample = end_ms * 16
 
+        try:
+            sf.write(output_path, pcm[start_sample:end_sample], 16000, subtype='PCM_16')
             success_count += 1
-            print(f"✓ Segment {segment_index:03d}: {start_ms}-{end_ms}ms -> {output_filename}")
-
+            # Lazy %s formatting: the line is only rendered when INFO is enabled
+            logger.info("✓ Segment %03d: %d-%dms -> %s", segment_index, start_ms, end_ms, output_filename)
         except Exception as e:
             error_count += 1
-            print(f"✗ Segment {segment_index:03d}: {segment['start']}-{segment['end']}ms -> ERROR: {str(e)}")
+            logger.error("✗ Segment %03d: %d-%dms -> ERROR: %s", segment_index, start_ms, end_ms, e)
 
     print(f"\nExtraction complete: {success_count} successful, {error_count} failed")
 
@@ -238,9 +413,20 @@ def main():
                        help='Directory to save audio segments (default: determined by input file type)')
     parser.add_argument('--skip-segments', action='store_true',
                        help='Skip audio segment extraction, only perform ASR')
+    parser.add_argument('--compute-type', default='int8_float16',
+                       help='Whisper compute type, e.g. int8_float16 (GPU) or int8 (CPU) '
+                            '(default: int8_float16)')
+    parser.add_argument('--beam-size', type=int, default=1,
+                       help='Decoder beam width, raise to 5 when top accuracy is needed '
+                            '(default: 1)')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Print per-segment progress (adds stdout I/O cost on long videos)')
 
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(message)s')
+
     # Set default output paths if not provided
     asr_output = args.asr_output if args.asr_output else get_default_output_path(args.input_file, 'asr')
     segments_dir = args.segments_dir if args.segments_dir else get_default_output_path(args.input_file, 'segments')
@@ -248,11 +434,16 @@ def main():
     try:
         # Perform ASR
         print(f"Processing input file: {args.input_file}")
-        asr_results, audio_file = perform_asr(args.input_file)
+        asr_results, audio_file = perform_asr(args.input_file, compute_type=args.compute_type,
+                                              beam_size=args.beam_size)
 
         # Save ASR results
-        with open(asr_output, 'w', encoding='utf-8') as f:
-            json.dump(asr_results, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(asr_output, 'wb') as f:
+                f.write(orjson.dumps(asr_results, option=orjson.OPT_INDENT_2))
+        else:
+            with open(asr_output, 'w', encoding='utf-8') as f:
+                json.dump(asr_results, f, ensure_ascii=False, indent=2)
         print(f"ASR results saved to {asr_output}")
 
         # Extract audio segments unless skipped
@@ -4,10 +4,49 @@
 提供GPU检测和硬件加速功能，用于多个脚本之间共享GPU相关代码
 """
 
+import functools
 import subprocess
 import sys
 import shutil
-from typing import Dict, Optional, Tuple
+from typing import Dict, FrozenSet, Optional, Tuple
+
+
+@functools.lru_cache(maxsize=1)
+def _probe_ffmpeg_encoders() -> FrozenSet[str]:
+    """
+    运行一次 `ffmpeg -encoders` 并解析出编码器名称集合
+
+    结果通过lru_cache缓存，后续的detect_gpu_support调用只做集合查询，
+    不再重复fork ffmpeg进程
+
+    Returns:
+        FrozenSet[str]: 可用编码器名称集合
+
+    Raises:
+        FileNotFoundError: 找不到ffmpeg
+        subprocess.TimeoutExpired: 检测超时
+        RuntimeError: ffmpeg返回非零退出码
+    """
+    # 先用which快速判断ffmpeg是否存在，避免无谓的进程启动
+    if shutil.which('ffmpeg') is None:
+        raise FileNotFoundError('ffmpeg')
+
+    ffmpeg_result = subprocess.run([
+        'ffmpeg', '-hide_banner', '-encoders'
+    ], capture_output=True, text=True, timeout=10)
+
+    if ffmpeg_result.returncode != 0:
+        raise RuntimeError('FFmpeg hardware acceleration check failed')
+
+    # 编码器表每行格式形如 " V....D h264_nvenc  NVIDIA NVENC H.264 encoder"
+    # 取第二列作为编码器名称
+    encoders = set()
+    for line in ffmpeg_result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            encoders.add(parts[1])
+
+    return frozenset(encoders)
 
 
 def detect_gpu_support() -> Dict[str, any]:
@@ -33,17 +72,11 @@ def detect_gpu_support() -> Dict[str, any]:
     }
 
     try:
-        # 检查FFmpeg是否支持硬件加速
-        ffmpeg_result = subprocess.run([
-            'ffmpeg', '-hide_banner', '-encoders'
-        ], capture_output=True, text=True, timeout=10)
-
-        if ffmpeg_result.returncode != 0:
-            result['details'] = 'FFmpeg hardware acceleration check failed'
-            return result
+        # 检查FFmpeg是否支持硬件加速（编码器列表只探测一次并缓存）
+        encoders = _probe_ffmpeg_encoders()
 
         # 检查NVIDIA NVENC
-        if 'h264_nvenc' in ffmpeg_result.stdout:
+        if 'h264_nvenc' in encoders:
             result['nvidia'] = True
             result['gpu_type'] = 'nvidia'
             result['available'] = True
@@ -51,7 +84,7 @@ def detect_gpu_support() -> Dict[str, any]:
             return result
 
         # 检查AMD AMF
-        if 'h264_amf' in ffmpeg_result.stdout:
+        if 'h264_amf' in encoders:
             result['amd'] = True
             result['gpu_type'] = 'amd'
             result['available'] = True
@@ -59,7 +92,7 @@ def detect_gpu_support() -> Dict[str, any]:
             return result
 
         # 检查Intel QSV
-        if 'h264_qsv' in ffmpeg_result.stdout:
+        if 'h264_qsv' in encoders:
             result['intel'] = True
             result['gpu_type'] = 'intel'
             result['available'] = True
@@ -67,8 +100,7 @@ def detect_gpu_support() -> Dict[str, any]:
             return result
 
         # 检查其他编码器
-        encoders = ffmpeg_result.stdout
-        if any(encoder in encoders for encoder in ['nvenc', 'amf', 'qsv']):
+        if any(keyword in name for name in encoders for keyword in ('nvenc', 'amf', 'qsv')):
             result['details'] = 'Hardware acceleration detected but not fully supported'
             result['available'] = True
         else:
@@ -78,19 +110,38 @@ def detect_gpu_support() -> Dict[str, any]:
         result['details'] = 'GPU detection timeout'
     except FileNotFoundError:
         result['details'] = 'FFmpeg not found'
+    except RuntimeError:
+        result['details'] = 'FFmpeg hardware acceleration check failed'
     except Exception as e:
         result['details'] = f'GPU detection error: {str(e)}'
 
     return result
 
 
+# x264风格预设名到NVENC现代p1-p7预设族的映射。
+# 旧名称走兼容路径，映射并不理想，会损失可观的NVENC吞吐；
+# p1最快/p7质量最高
+_NVENC_PRESET_MAP = {
+    'ultrafast': 'p1',
+    'superfast': 'p1',
+    'veryfast': 'p2',
+    'faster': 'p3',
+    'fast': 'p3',
+    'medium': 'p4',
+    'slow': 'p6',
+    'slower': 'p7',
+    'veryslow': 'p7',
+}
+
+
 def get_ffmpeg_gpu_args(gpu_type: str, preset: str = 'medium') -> list:
     """
     获取FFmpeg GPU硬件加速参数
 
     Args:
         gpu_type: GPU类型 ('nvidia', 'amd', 'intel', 'none')
-        preset: 编码预设 ('fast', 'medium', 'slow', etc.)
+        preset: 编码预设 ('fast', 'medium', 'slow', etc.)；
+                NVIDIA下会映射为NVENC的p1-p7预设族，也可直接传'p1'-'p7'
 
     Returns:
         list: FFmpeg GPU参数列表
@@ -98,11 +149,13 @@ def get_ffmpeg_gpu_args(gpu_type: str, preset: str = 'medium') -> list:
     if gpu_type == 'nvidia':
         return [
             '-c:v', 'h264_nvenc',
-            '-preset', preset,
+            '-preset', _NVENC_PRESET_MAP.get(preset, preset),
             '-tune', 'll',  # 低延迟
             '-rc', 'vbr',  # 可变比特率
             '-cq', '20',   # 质量参数
-            '-b:v', '2M'   # 目标比特率
+            '-b:v', '2M',  # 目标比特率
+            '-rc-lookahead', '16',  # 前瞻帧数，提升码率分配
+            '-spatial-aq', '1'      # 空间自适应量化
         ]
     elif gpu_type == 'amd':
         return [
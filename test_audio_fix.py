@@ -9,8 +9,24 @@ import json
 import os
 import sys
 
+import soundfile as sf
+
 def get_audio_info(audio_path):
     """获取音频文件的详细信息"""
+    # WAV文件只需读头部（进程内一次open+read），无需为每个文件fork一个ffprobe
+    if audio_path.lower().endswith('.wav'):
+        try:
+            info = sf.info(audio_path)
+            return {
+                'sample_rate': str(info.samplerate),
+                'channels': info.channels,
+                'codec': info.subtype.lower() if info.subtype else 'unknown',
+                'bit_rate': 'unknown',
+                'duration': info.frames / info.samplerate if info.samplerate else 0.0
+            }
+        except Exception:
+            pass  # 回退到ffprobe
+
     cmd = [
         'ffprobe', '-v', 'quiet', '-print_format', 'json',
         '-show_format', '-show_streams', audio_path
@@ -1,84 +1,303 @@
+import asyncio
 import dashscope
+import diskcache
+import numpy as np
+import requests
+from blake3 import blake3
+from collections import deque
 from http import HTTPStatus
 import json
+import logging
+import operator
+import random
 import time
 import os
 from typing import List, Dict, Optional
 from config import get_api_key
 
-def find_largest_gap(segments: List[dict]) -> tuple[int, int]:
+try:
+    import orjson
+except ImportError:
+    orjson = None  # orjson未安装时回退到标准库json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None  # ijson未安装时回退到一次性加载
+
+logger = logging.getLogger(__name__)
+
+# 有界并发度：按账号RPM上限调整，8对应约500 RPM的档位
+TRANSLATE_MAX_CONCURRENCY = 8
+
+# DashScope OpenAI兼容Batch API端点与轮询参数
+DASHSCOPE_COMPAT_BASE = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+BATCH_POLL_INITIAL_SECONDS = 10
+BATCH_POLL_MAX_SECONDS = 300
+# 轮询总时限：Batch任务的completion_window长达24小时，没有截止时间的话
+# 整条管线可能阻塞一天才走到回退路径；超时抛异常，由调用方回退逐段并发翻译。
+# 可通过环境变量按视频长短调整
+BATCH_POLL_DEADLINE_SECONDS = int(os.environ.get('TRANSVOICE_BATCH_POLL_DEADLINE', 1800))
+
+# qwen调用的有限超时与重试策略：指数退避+抖动，仅对限流/服务端错误重试
+QWEN_MAX_RETRIES = 6
+QWEN_BACKOFF_MAX_SECONDS = 60
+QWEN_REQUEST_TIMEOUT_SECONDS = 30
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# LLM结果持久化缓存：相同输入的分段/翻译结果落盘，
+# 重跑管线时直接命中，既省token也省限速等待
+_MERGE_CACHE = diskcache.Cache(os.path.join(".cache", "qwen_merge"))
+_TRANSLATE_CACHE = diskcache.Cache(os.path.join(".cache", "qwen_translate"))
+
+
+# 翻译提示词：静态的术语表/规则作为user消息的固定前缀，逐段逐字节一致，
+# 供应商照样按前缀缓存计费。注意qwen-mt系列翻译模型只接受单条user消息，
+# 带system角色的请求会被InvalidParameter直接拒绝，所以不能拆成system+user两段。
+# 同步与Batch两条翻译路径共用
+_TRANSLATION_PROMPT_PREFIX = """
+将以下英文段落翻译成自然流畅的中文。
+
+ICT核心术语对照：
+AMD (Accumulation, Manipulation, Distribution) = AMD模型
+PO3 (Power of Three) = Power of three模型
+power three = Power of three模型
+BISI (Buy Side Imbalance Sell Side Inefficiency) = 买方失衡卖方低效
+SIBI (Sell Side Imbalance Buy Side Inefficiency) = 卖方失衡买方低效
+BPR (Balanced Price Range) = 平衡价格区间
+BSL (Buy Side Liquidity) = 买方流动性
+SSL (Sell Side Liquidity) = 卖方流动性
+BE (Breakeven) = 盈亏平衡
+BOS (Break of Structure) = 结构突破
+CE (Consequent Encroachment) = FVG中点
+FVG (Fair Value Gap) = 公允价值缺口
+IFVG (Inversion Fair Value Gap) = 反转公允价值缺口
+HTF (Higher Time Frame) = 高时间框架
+LTF (Lower Time Frame) = 低时间框架
+IPDA (Inter Bank Price Delivery Algorithm) = 银行间价格传递算法
+STH (Short Term High) = 短期高点
+ITH (Intermediate Term High) = 中期高点
+LTH (Long Term High) = 长期高点
+STL (Short Term Low) = 短期低点
+ITL (Intermediate Term Low) = 中期低点
+LTL (Long Term Low) = 长期低点
+MSS (Market Structure Shift) = 市场结构转变
+MT (Mean Threshold) = 订单块中点
+OB (Order Block) = 订单块
+OTE (Optimal Trade Entry) = 最佳交易入场
+PDL (Previous Day Low) = 前一日低点
+PDH (Previous Day High) = 前一日高点
+ERL (External Range Liquidity) = 外部流动性
+IRL (Internal Range Liquidity) = 内部流动性
+PD Array (Premium & Discount Array) = PD阵列
+BB (Breaker Block) = 突破块
+MB (Mitigation Block) = 缓解块
+NWOG (New Week Opening Gap) = 新周开盘缺口
+LP (Liquidity Pool) = 流动性池
+TGIF (Thanks God It's Friday) = TGIF
+KZ(Kill Zone) = Kill Zone
+Asia kill zone = 亚洲Kill Zone
+NewYork ill zone = 纽约Kill Zone
+London kill zone = 伦敦Kill zone
+
+传统交易术语对照：
+Silver Bullet = 银弹
+Lot = 手
+Spread = 点差
+Margin = 保证金
+Leverage = 杠杆
+Bid = 买价
+Ask = 卖价
+Swap = 隔夜利息
+Long = 多头
+Short = 空头
+Stop Loss = 止损
+Take Profit = 止盈
+pip = pip
+pips = pips
+handle = handle
+tick = tick
+point = 点
+Draw on liquidity = 利用流动性
+liquidity pool(或者拼错成 poll, polls) = 流动性池
+swing = 波段
+swing points = 摆动点
+session = 时段
+liquidity = 流动性
+probability = 概率
+smart money = 聪明钱
+liquidity raid = 流动性突袭
+stop hunt = 止损猎杀
+retail = 散户
+institutional = 机构
+price = 价格
+up close candle = 阳线
+bias = 市场偏见
+day trade = 日内交易
+journaling = 交易日志
+
+要求：
+- 翻译整个段落，保持语义连贯
+- 保持ICT专业术语准确性
+- 避免生硬直译
+- 确保ICT概念翻译的专业性和准确性
+- 数字用大写的中文表示：零、壹、贰、叁、肆、伍、陆、柒、捌、玖、拾、佰、仟、万、亿
+- 尽量保证翻译后的中文阅读时长与英文原文一致，可通过调整语言简洁程度来实现
+- Ok, Okay尽量翻译成"好"，而不是"好的"
+- 翻译货币对时，比如EUR/USD，中间的斜杠(/)翻译成“兑”，举例说：“EUR/USD”翻译成欧元兑美元
+"""
+
+_TRANSLATION_USER_TEMPLATE = """英文段落：
+{original_text}
+
+中文翻译："""
+
+
+# 提示词版本号：前缀或模板一改，翻译缓存键随之变化，旧缓存自动失效
+_PROMPT_TEMPLATE_VERSION = blake3(
+    (_TRANSLATION_PROMPT_PREFIX + _TRANSLATION_USER_TEMPLATE).encode('utf-8')).hexdigest(length=8)
+
+
+def _translation_cache_key(text: str) -> str:
+    """翻译缓存键：模型 + 提示词模板版本 + 原文"""
+    return blake3(f"qwen-mt-turbo\x00{_PROMPT_TEMPLATE_VERSION}\x00{text}".encode('utf-8')).hexdigest()
+
+
+def _call_qwen(model: str, messages: List[dict], api_key: str, **kwargs):
+    """
+    统一的dashscope调用入口：有限超时 + 指数退避重试
+
+    每次请求带request_timeout预算，上游卡死不会拖垮整条管线。
+    不设全局max_tokens上限：合并段落最长可达150个ASR分段，中文译文
+    完全可能超过任何固定预算，截断比慢更糟；确有需要的调用方
+    可以通过kwargs按次传入。
+    仅在限流(429)、服务端错误(5xx)和网络异常时重试，退避时间带随机抖动，
+    避免多个并发worker同步重试造成惊群；其余错误直接返回给调用方处理。
+    有了按需退避，固定的限速sleep就不再需要了。
+
+    Returns:
+        dashscope响应对象；重试耗尽且从未收到响应时抛出RuntimeError
+    """
+    # API密钥在translate_asr_results入口统一设置；这里只在密钥变化时
+    # 重新赋值，避免每次调用都扰动SDK的全局状态
+    if dashscope.api_key != api_key:
+        dashscope.api_key = api_key
+    last_response = None
+
+    for attempt in range(QWEN_MAX_RETRIES):
+        if attempt > 0:
+            wait = min(QWEN_BACKOFF_MAX_SECONDS, 2 ** (attempt - 1)) + random.uniform(0, 1)
+            print(f"qwen调用第{attempt}次重试({model})，退避 {wait:.1f} 秒...")
+            time.sleep(wait)
+
+        try:
+            response = dashscope.Generation.call(
+                model=model,
+                messages=messages,
+                request_timeout=QWEN_REQUEST_TIMEOUT_SECONDS,
+                **kwargs
+            )
+        except Exception as e:
+            # 网络/超时类异常与5xx同等对待，继续退避重试
+            print(f"qwen调用异常({model}): {e}")
+            continue
+
+        if response.status_code == HTTPStatus.OK:
+            return response
+
+        last_response = response
+        if response.status_code not in _RETRYABLE_STATUS_CODES:
+            return response
+        print(f"qwen返回 {response.status_code}({model})，准备重试: {response.message}")
+
+    if last_response is None:
+        raise RuntimeError(f"qwen调用重试{QWEN_MAX_RETRIES}次后仍然失败({model})")
+    return last_response
+
+
+def find_largest_gap(starts: np.ndarray, ends: np.ndarray, lo: int, hi: int) -> tuple[int, int]:
     """
-    找到segments中时间间隔最大的位置
+    找到索引范围[lo, hi)内时间间隔最大的位置
+
+    时间戳数组只在分割开始前构建一次，这里做一次C级的
+    向量化减法加argmax，替代逐元素的Python循环
 
     Args:
-        segments: segment列表
+        starts: 全部segment起始时间数组（毫秒）
+        ends: 全部segment结束时间数组（毫秒）
+        lo: 范围起始索引（含）
+        hi: 范围结束索引（不含）
 
     Returns:
-        tuple[int, int]: (最大间隔大小, 分割点索引)
+        tuple[int, int]: (最大间隔大小, 分割点全局索引)；无正间隔时返回(0, -1)
     """
-    if len(segments) < 2:
+    if hi - lo < 2:
         return (0, -1)
 
-    max_gap = 0
-    split_index = -1
+    gaps = starts[lo + 1:hi] - ends[lo:hi - 1]
+    offset = int(np.argmax(gaps))
+    max_gap = int(gaps[offset])
 
-    for i in range(1, len(segments)):
-        gap = segments[i]["start"] - segments[i-1]["end"]
-        if gap > max_gap:
-            max_gap = gap
-            split_index = i
+    if max_gap <= 0:
+        return (0, -1)
 
-    return (max_gap, split_index)
+    return (max_gap, lo + 1 + offset)
 
 
 
 
-def split_segments_recursively(segments: List[dict], max_segment_size) -> List[List[dict]]:
+def split_ranges(starts: np.ndarray, ends: np.ndarray, max_segment_size) -> List[tuple[int, int]]:
     """
-    递归分割segments，确保每段长度不超过max_segment_size
+    迭代分割索引范围，确保每段长度不超过max_segment_size
+
+    用显式的(lo, hi)范围队列替代递归：每层不复制底层列表，
+    也没有递归深度限制；左半段先入队先处理，
+    保证输出范围按lo升序排列，与原始segments顺序一致
 
     Args:
-        segments: 待分割的segment列表
+        starts: 全部segment起始时间数组（毫秒）
+        ends: 全部segment结束时间数组（毫秒）
         max_segment_size: 每段的最大长度
 
     Returns:
-        List[List[dict]]: 分割后的chunks列表
+        List[tuple[int, int]]: 分割后的(lo, hi)范围列表
     """
-    # 基础情况：如果长度小于等于max_segment_size，直接返回
-    if len(segments) <= max_segment_size:
-        return [segments]
+    pending = deque([(0, len(starts))])
+    ranges = []
 
-    print(f"当前segment长度: {len(segments)}, 超过最大限制 {max_segment_size}，需要分割")
+    while pending:
+        lo, hi = pending.popleft()
 
-    # 找到时间间隔最大的位置
-    max_gap, split_index = find_largest_gap(segments)
+        # 长度达标的范围直接输出
+        if hi - lo <= max_segment_size:
+            ranges.append((lo, hi))
+            continue
 
-    if split_index == -1:
-        # 如果找不到合适的分割点（理论上不应该发生），强制从中间分割
-        split_index = len(segments) // 2
-        print(f"未找到合适的时间间隙，强制从中间位置 {split_index} 分割")
-    else:
-        print(f"找到最大时间间隙: {max_gap}ms，在索引 {split_index} 处分割")
+        logger.info("当前segment长度: %d, 超过最大限制 %d，需要分割", hi - lo, max_segment_size)
+
+        # 找到时间间隔最大的位置
+        max_gap, split_index = find_largest_gap(starts, ends, lo, hi)
 
-    # 分割成两段
-    left_part = segments[:split_index]
-    right_part = segments[split_index:]
+        if split_index == -1:
+            # 如果找不到合适的分割点（理论上不应该发生），强制从中间分割
+            split_index = lo + (hi - lo) // 2
+            logger.info("未找到合适的时间间隙，强制从中间位置 %d 分割", split_index)
+        else:
+            logger.info("找到最大时间间隙: %dms，在索引 %d 处分割", max_gap, split_index)
 
-    print(f"分割为: 左段 {len(left_part)} 个segments, 右段 {len(right_part)} 个segments")
+        logger.info("分割为: 左段 %d 个segments, 右段 %d 个segments", split_index - lo, hi - split_index)
 
-    # 递归处理两段
-    left_chunks = split_segments_recursively(left_part, max_segment_size)
-    right_chunks = split_segments_recursively(right_part, max_segment_size)
+        # 左段压在队首先处理，维持输出顺序
+        pending.appendleft((split_index, hi))
+        pending.appendleft((lo, split_index))
 
-    # 合并结果，直接返回，不进行额外合并
-    all_chunks = left_chunks + right_chunks
-    return all_chunks
+    return ranges
 
 
 def merge_segments_with_qwen_max(segments: List[dict], api_key: str, max_segment_size: int = 150) -> List[dict]:
     """
     使用qwen-turbo对segments进行语义合并，返回合并后的段落
-    为防止超时，使用递归分割算法将大段分割成小段
+    为防止超时，按最大时间间隙迭代地将大段分割成小段
 
     Args:
         segments: 待合并的segment列表
@@ -94,23 +313,35 @@ def merge_segments_with_qwen_max(segments: List[dict], api_key: str, max_segment
     print(f"使用qwen-turbo对{len(segments)}个segments进行语义合并...")
     print(f"最大段长度限制: {max_segment_size}")
 
-    # 使用递归分割算法分割segments
-    chunks = split_segments_recursively(segments, max_segment_size)
+    # 一次性预计算时间戳数组，所有递归分割调用共享，只在索引上工作
+    starts = np.fromiter((s["start"] for s in segments), dtype=np.int64, count=len(segments))
+    ends = np.fromiter((s["end"] for s in segments), dtype=np.int64, count=len(segments))
+
+    # 迭代分割索引范围，chunk边界确定后统一切片
+    ranges = split_ranges(starts, ends, max_segment_size)
+    chunks = [segments[lo:hi] for lo, hi in ranges]
+
+    print(f"分割完成，总共分成{len(chunks)}个chunk")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("各chunk长度: %s", [len(chunk) for chunk in chunks])
+
+    # 并发处理所有chunk：各chunk相互独立，用有界的异步工作池同时发起请求，
+    # 由信号量限制在途请求数，不再用固定的10秒串行等待
+    async def merge_all():
+        semaphore = asyncio.Semaphore(TRANSLATE_MAX_CONCURRENCY)
 
-    print(f"递归分割完成，总共分成{len(chunks)}个chunk: {[len(chunk) for chunk in chunks]}")
+        async def merge_one(i, chunk):
+            async with semaphore:
+                logger.info("处理第%d/%d个chunk，包含%d个segments...", i + 1, len(chunks), len(chunk))
+                # dashscope SDK是同步接口，放入线程执行避免阻塞事件循环
+                return await asyncio.to_thread(merge_single_chunk_with_qwen_turbo, chunk, api_key)
+
+        return await asyncio.gather(*[merge_one(i, chunk) for i, chunk in enumerate(chunks)])
 
-    # 处理每个chunk
     all_merged_segments = []
-    for i, chunk in enumerate(chunks):
-        print(f"处理第{i+1}/{len(chunks)}个chunk，包含{len(chunk)}个segments...")
-        chunk_merged = merge_single_chunk_with_qwen_turbo(chunk, api_key)
+    for chunk_merged in asyncio.run(merge_all()):
         all_merged_segments.extend(chunk_merged)
 
-        # 如果不是最后一个chunk，添加延迟以避免API限速
-        if i < len(chunks) - 1:
-            print("等待10秒后处理下一个chunk...")
-            time.sleep(10)
-
     print(f"语义合并完成，原来{len(segments)}个segments合并为{len(all_merged_segments)}个段落")
     return all_merged_segments
 
@@ -119,14 +350,12 @@ def merge_single_chunk_with_qwen_turbo(segments: List[dict], api_key: str) -> Li
     """
     对单个chunk的segments进行语义合并
     """
-    # 构建输入数据，只包含qwen-turbo需要的字段
-    input_data = []
-    for segment in segments:
-        input_data.append({
-            "start": int(round(segment["start"])),
-            "end": int(round(segment["end"])),
-            "text": segment["text"]
-        })
+    # 构建输入数据，只包含qwen-turbo需要的字段。
+    # ASR JSON里的时间戳本来就是整数毫秒，int()兜底即可，不必round
+    input_data = [
+        {"start": int(segment["start"]), "end": int(segment["end"]), "text": segment["text"]}
+        for segment in segments
+    ]
 
     # 构建系统提示词
     system_prompt = """你是一个专业的多模态视频字幕分段引擎。输入是一个包含双语文本和时间戳的句子数组，每个元素格式如下：
@@ -157,83 +386,85 @@ def merge_single_chunk_with_qwen_turbo(segments: List[dict], api_key: str) -> Li
 
 【现在处理用户提供的完整输入】"""
 
-    try:
-        dashscope.api_key = api_key
-
-        # 调用qwen-turbo
-        response = dashscope.Generation.call(
-            model='qwen3-max',
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': json.dumps(input_data, ensure_ascii=False)}
-            ],
-            response_format={"type": "json_object"}  # 指定返回JSON格式
-        )
+    # 持久化缓存：相同的输入chunk得到相同的分段结果，
+    # 命中时跳过LLM调用和限速等待
+    cache_key = blake3(json.dumps(input_data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    paragraph_starts = _MERGE_CACHE.get(cache_key)
 
-        if response.status_code == HTTPStatus.OK:
-            result = json.loads(response.output.choices[0].message.content)
-            paragraph_starts = result.get('paragraph_starts', [0])
-
-            print(f"qwen-turbo返回的段落起始索引: {paragraph_starts}")
-
-            # 添加20秒延迟以避免API限速
-            time.sleep(20)
-
-            # 根据paragraph_starts合并segments
-            merged_segments = []
-
-            for i, start_idx in enumerate(paragraph_starts):
-                # 确定段落的结束索引
-                if i < len(paragraph_starts) - 1:
-                    end_idx = paragraph_starts[i + 1]
-                else:
-                    end_idx = len(segments)
-
-                # 合并这个段落的所有segments
-                paragraph_segments = segments[start_idx:end_idx]
-                if not paragraph_segments:
-                    continue
-
-                # 合并文本和时间戳
-                merged_text = " ".join([seg["text"] for seg in paragraph_segments])
-                merged_start = int(round(paragraph_segments[0]["start"]))
-                merged_end = int(round(paragraph_segments[-1]["end"]))
-
-                merged_segment = {
-                    "start": merged_start,
-                    "end": merged_end,
-                    "text": merged_text,
-                    "original_segments": paragraph_segments  # 保留原始segments信息
-                }
-
-                merged_segments.append(merged_segment)
+    if paragraph_starts is not None:
+        logger.info("分段结果缓存命中(%s)，跳过qwen调用", cache_key[:8])
+    else:
+        try:
+            # 调用qwen-turbo
+            response = _call_qwen(
+                'qwen3-max',
+                [
+                    {'role': 'system', 'content': system_prompt},
+                    {'role': 'user', 'content': orjson.dumps(input_data).decode()
+                     if orjson is not None else json.dumps(input_data, ensure_ascii=False)}
+                ],
+                api_key,
+                response_format={"type": "json_object"}  # 指定返回JSON格式
+            )
+
+            if response.status_code == HTTPStatus.OK:
+                result = json.loads(response.output.choices[0].message.content)
+                paragraph_starts = result.get('paragraph_starts', [0])
+
+                logger.info("qwen-turbo返回的段落起始索引: %s", paragraph_starts)
+                _MERGE_CACHE.set(cache_key, paragraph_starts)
+
+            else:
+                print(f"qwen-turbo调用失败: {response.message}")
+                # 如果qwen-turbo失败，返回原始segments（不合并）
+                return segments
+
+        except Exception as e:
+            print(f"qwen-turbo处理异常: {str(e)}")
+            # 如果处理失败，返回原始segments（不合并）
+            return segments
 
-            return merged_segments
+    # 根据paragraph_starts合并segments
+    merged_segments = []
+    get_text = operator.itemgetter("text")
 
+    for i, start_idx in enumerate(paragraph_starts):
+        # 确定段落的结束索引
+        if i < len(paragraph_starts) - 1:
+            end_idx = paragraph_starts[i + 1]
         else:
-            print(f"qwen-turbo调用失败: {response.message}")
-            # 如果qwen-turbo失败，返回原始segments（不合并）
-            return segments
+            end_idx = len(segments)
+
+        # 合并这个段落的所有segments
+        paragraph_segments = segments[start_idx:end_idx]
+        if not paragraph_segments:
+            continue
+
+        # 合并文本和时间戳。itemgetter+map在C层取字段，
+        # 省掉内层循环的字节码分发和中间列表
+        merged_text = " ".join(map(get_text, paragraph_segments))
+        merged_start = int(paragraph_segments[0]["start"])
+        merged_end = int(paragraph_segments[-1]["end"])
+
+        merged_segment = {
+            "start": merged_start,
+            "end": merged_end,
+            "text": merged_text,
+            "original_segments": paragraph_segments  # 保留原始segments信息
+        }
 
-    except Exception as e:
-        print(f"qwen-turbo处理异常: {str(e)}")
-        # 如果处理失败，返回原始segments（不合并）
-        return segments
+        merged_segments.append(merged_segment)
+
+    return merged_segments
 
 
 def try_translation(messages, api_key: str):
-    """尝试翻译，支持重试"""
+    """尝试翻译，超时与重试由_call_qwen统一处理"""
     try:
-        dashscope.api_key = api_key
-        response = dashscope.Generation.call(
-            model='qwen-mt-turbo',
-            messages=messages,
-        )
+        response = _call_qwen('qwen-mt-turbo', messages, api_key)
 
         if response.status_code == HTTPStatus.OK:
             response_content = response.output.choices[0].message.content
-            # 添加1秒延迟以避免API限速
-            time.sleep(1)
             return response_content, None
         else:
             error_message = f"Error: {response.message}"
@@ -245,151 +476,208 @@ def try_translation(messages, api_key: str):
 
 def translate_merged_paragraphs(merged_segments: List[dict], api_key: str) -> List[dict]:
     """
-    直接翻译合并后的段落，不再分段批量翻译
+    并发翻译合并后的段落：各段落相互独立，用有界的异步工作池
+    同时发起请求，端到端延迟从所有请求RTT之和变为最慢一批的RTT。
+    完全相同的段落文本（重复的免责声明、片头片尾等）只翻译一次，
+    结果散播回每个出现位置
     """
     if not api_key:
         raise ValueError("DASHSCOPE_API_KEY is not set.")
 
-    all_translated_segments = []
-
-    # 翻译提示模板（针对段落翻译优化）
-    prompt_template = """
-将以下英文段落翻译成自然流畅的中文。
-
-ICT核心术语对照：
-AMD (Accumulation, Manipulation, Distribution) = AMD模型
-PO3 (Power of Three) = Power of three模型
-power three = Power of three模型
-BISI (Buy Side Imbalance Sell Side Inefficiency) = 买方失衡卖方低效
-SIBI (Sell Side Imbalance Buy Side Inefficiency) = 卖方失衡买方低效
-BPR (Balanced Price Range) = 平衡价格区间
-BSL (Buy Side Liquidity) = 买方流动性
-SSL (Sell Side Liquidity) = 卖方流动性
-BE (Breakeven) = 盈亏平衡
-BOS (Break of Structure) = 结构突破
-CE (Consequent Encroachment) = FVG中点
-FVG (Fair Value Gap) = 公允价值缺口
-IFVG (Inversion Fair Value Gap) = 反转公允价值缺口
-HTF (Higher Time Frame) = 高时间框架
-LTF (Lower Time Frame) = 低时间框架
-IPDA (Inter Bank Price Delivery Algorithm) = 银行间价格传递算法
-STH (Short Term High) = 短期高点
-ITH (Intermediate Term High) = 中期高点
-LTH (Long Term High) = 长期高点
-STL (Short Term Low) = 短期低点
-ITL (Intermediate Term Low) = 中期低点
-LTL (Long Term Low) = 长期低点
-MSS (Market Structure Shift) = 市场结构转变
-MT (Mean Threshold) = 订单块中点
-OB (Order Block) = 订单块
-OTE (Optimal Trade Entry) = 最佳交易入场
-PDL (Previous Day Low) = 前一日低点
-PDH (Previous Day High) = 前一日高点
-ERL (External Range Liquidity) = 外部流动性
-IRL (Internal Range Liquidity) = 内部流动性
-PD Array (Premium & Discount Array) = PD阵列
-BB (Breaker Block) = 突破块
-MB (Mitigation Block) = 缓解块
-NWOG (New Week Opening Gap) = 新周开盘缺口
-LP (Liquidity Pool) = 流动性池
-TGIF (Thanks God It's Friday) = TGIF
-KZ(Kill Zone) = Kill Zone
-Asia kill zone = 亚洲Kill Zone
-NewYork ill zone = 纽约Kill Zone
-London kill zone = 伦敦Kill zone
-
-传统交易术语对照：
-Silver Bullet = 银弹
-Lot = 手
-Spread = 点差
-Margin = 保证金
-Leverage = 杠杆
-Bid = 买价
-Ask = 卖价
-Swap = 隔夜利息
-Long = 多头
-Short = 空头
-Stop Loss = 止损
-Take Profit = 止盈
-pip = pip
-pips = pips
-handle = handle
-tick = tick
-point = 点
-Draw on liquidity = 利用流动性
-liquidity pool(或者拼错成 poll, polls) = 流动性池
-swing = 波段
-swing points = 摆动点
-session = 时段
-liquidity = 流动性
-probability = 概率
-smart money = 聪明钱
-liquidity raid = 流动性突袭
-stop hunt = 止损猎杀
-retail = 散户
-institutional = 机构
-price = 价格
-up close candle = 阳线
-bias = 市场偏见
-day trade = 日内交易
-journaling = 交易日志
-
-要求：
-- 翻译整个段落，保持语义连贯
-- 保持ICT专业术语准确性
-- 避免生硬直译
-- 确保ICT概念翻译的专业性和准确性
-- 数字用大写的中文表示：零、壹、贰、叁、肆、伍、陆、柒、捌、玖、拾、佰、仟、万、亿
-- 尽量保证翻译后的中文阅读时长与英文原文一致，可通过调整语言简洁程度来实现
-- Ok, Okay尽量翻译成"好"，而不是"好的"
-- 翻译货币对时，比如EUR/USD，中间的斜杠(/)翻译成“兑”，举例说：“EUR/USD”翻译成欧元兑美元
-
-英文段落：
-{original_text}
+    # 按原文去重，保持首次出现的顺序
+    unique_texts = list(dict.fromkeys(seg['text'] for seg in merged_segments))
+    if len(unique_texts) < len(merged_segments):
+        print(f"检测到重复段落：{len(merged_segments)} 个段落去重后剩 {len(unique_texts)} 个唯一文本")
+
+    async def translate_all():
+        semaphore = asyncio.Semaphore(TRANSLATE_MAX_CONCURRENCY)
+
+        async def translate_one(text_idx, text):
+            # 持久化缓存：重跑时相同原文直接命中磁盘
+            cache_key = _translation_cache_key(text)
+            translated_text = _TRANSLATE_CACHE.get(cache_key)
+            if translated_text is not None:
+                logger.info("文本 %d 翻译缓存命中", text_idx + 1)
+                return translated_text, None
+
+            async with semaphore:
+                logger.info("翻译文本 %d/%d，长度: %d 字符...", text_idx + 1, len(unique_texts), len(text))
+
+                messages = [
+                    {'role': 'user', 'content': _TRANSLATION_PROMPT_PREFIX
+                     + _TRANSLATION_USER_TEMPLATE.format(original_text=text)}
+                ]
+
+                # dashscope SDK是同步接口，放入线程执行避免阻塞事件循环
+                response_content, error = await asyncio.to_thread(try_translation, messages, api_key)
+
+            if response_content:
+                translated_text = response_content.strip()
+                _TRANSLATE_CACHE.set(cache_key, translated_text)
+                logger.info("文本 %d 翻译成功", text_idx + 1)
+                return translated_text, None
+
+            print(f"文本 {text_idx + 1} 翻译失败: {error}")
+            return None, error
+
+        # gather保证返回顺序与unique_texts一致
+        return await asyncio.gather(*[translate_one(i, text)
+                                      for i, text in enumerate(unique_texts)])
+
+    translations = dict(zip(unique_texts, asyncio.run(translate_all())))
+
+    # 把唯一文本的翻译结果散播回原始段落顺序，保留时间戳信息
+    translated_segments = []
+    for merged_segment in merged_segments:
+        translated_text, error = translations[merged_segment['text']]
+        translated_segments.append({
+            "start": merged_segment["start"],
+            "end": merged_segment["end"],
+            "original_text": merged_segment["text"],
+            "translated_text": translated_text if translated_text is not None else f"[翻译错误: {error}]",
+            "original_segments": merged_segment.get("original_segments", [])  # 保留原始segments信息
+        })
 
-中文翻译：
-"""
+    return translated_segments
 
-    # 逐个段落翻译
-    for para_idx, merged_segment in enumerate(merged_segments):
-        print(f"翻译段落 {para_idx + 1}/{len(merged_segments)}，长度: {len(merged_segment['text'])} 字符...")
 
-        final_prompt = prompt_template.format(original_text=merged_segment['text'])
-        messages = [{'role': 'user', 'content': final_prompt}]
+def translate_merged_paragraphs_batch(merged_segments: List[dict], api_key: str) -> List[dict]:
+    """
+    通过DashScope Batch API整批提交段落翻译任务
 
-        # 翻译段落
-        response_content, error = try_translation(messages, api_key)
+    离线管线没有人在等待单条结果，Batch API按约一半的token价格计费，
+    且不占用实时RPM配额。所有段落打包成一个JSONL文件一次性上传，
+    每行带custom_id（段落索引），轮询任务完成后下载结果文件，
+    按custom_id映射回原始段落顺序。任何一步失败——包括轮询超过
+    BATCH_POLL_DEADLINE_SECONDS仍未完成——都抛出异常，
+    由调用方回退到逐段并发翻译路径。
 
-        if response_content:
-            translated_text = response_content.strip()
-            print(f"段落 {para_idx + 1} 翻译成功")
+    Args:
+        merged_segments: 合并后的段落列表
+        api_key: DashScope API密钥
 
-            # 创建翻译后的segment，保留原始的时间戳信息
-            all_translated_segments.append({
-                "start": merged_segment["start"],
-                "end": merged_segment["end"],
-                "original_text": merged_segment["text"],
-                "translated_text": translated_text,
-                "original_segments": merged_segment.get("original_segments", [])  # 保留原始segments信息
-            })
-        else:
-            print(f"段落 {para_idx + 1} 翻译失败: {error}")
-            # 创建错误条目
-            all_translated_segments.append({
-                "start": merged_segment["start"],
-                "end": merged_segment["end"],
-                "original_text": merged_segment["text"],
-                "translated_text": f"[翻译错误: {error}]",
-                "original_segments": merged_segment.get("original_segments", [])
-            })
+    Returns:
+        List[dict]: 翻译后的段落列表，顺序与输入一致
+    """
+    if not api_key:
+        raise ValueError("DASHSCOPE_API_KEY is not set.")
+    if not merged_segments:
+        return []
 
-        # 添加延迟以避免API限速
-        time.sleep(1)
+    headers = {'Authorization': f'Bearer {api_key}'}
+
+    # 构建批量任务JSONL：每个段落一行，custom_id为段落索引
+    lines = []
+    for idx, merged_segment in enumerate(merged_segments):
+        lines.append(json.dumps({
+            "custom_id": str(idx),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": "qwen-mt-turbo",
+                "messages": [
+                    {'role': 'user', 'content': _TRANSLATION_PROMPT_PREFIX
+                     + _TRANSLATION_USER_TEMPLATE.format(original_text=merged_segment['text'])}
+                ]
+            }
+        }, ensure_ascii=False))
+    jsonl_payload = "\n".join(lines).encode('utf-8')
+
+    print(f"上传批量翻译任务文件（{len(merged_segments)} 个段落）...")
+    upload_response = requests.post(
+        f"{DASHSCOPE_COMPAT_BASE}/files",
+        headers=headers,
+        files={'file': ('translate_batch.jsonl', jsonl_payload)},
+        data={'purpose': 'batch'},
+        timeout=120
+    )
+    upload_response.raise_for_status()
+    input_file_id = upload_response.json()['id']
+
+    create_response = requests.post(
+        f"{DASHSCOPE_COMPAT_BASE}/batches",
+        headers=headers,
+        json={
+            'input_file_id': input_file_id,
+            'endpoint': '/v1/chat/completions',
+            'completion_window': '24h'
+        },
+        timeout=60
+    )
+    create_response.raise_for_status()
+    batch_id = create_response.json()['id']
+    print(f"批量任务已创建: {batch_id}，开始轮询状态...")
+
+    # 指数退避轮询，避免对状态接口高频打点；同时带总时限，
+    # 任务迟迟不完成时及早放弃，交给逐段并发路径兜底
+    deadline = time.monotonic() + BATCH_POLL_DEADLINE_SECONDS
+    poll_interval = BATCH_POLL_INITIAL_SECONDS
+    while True:
+        status_response = requests.get(
+            f"{DASHSCOPE_COMPAT_BASE}/batches/{batch_id}",
+            headers=headers,
+            timeout=60
+        )
+        status_response.raise_for_status()
+        batch_info = status_response.json()
+        status = batch_info.get('status')
+
+        if status == 'completed':
+            break
+        if status in ('failed', 'expired', 'cancelled'):
+            raise RuntimeError(f"批量翻译任务{status}: {batch_info.get('errors')}")
+
+        if time.monotonic() + poll_interval > deadline:
+            raise RuntimeError(
+                f"批量翻译任务超过轮询时限({BATCH_POLL_DEADLINE_SECONDS}秒)仍未完成，"
+                f"当前状态: {status}")
+
+        counts = batch_info.get('request_counts') or {}
+        print(f"批量任务状态: {status}，已完成 {counts.get('completed', 0)}/{counts.get('total', len(merged_segments))}，{poll_interval}秒后重试...")
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, BATCH_POLL_MAX_SECONDS)
+
+    output_file_id = batch_info.get('output_file_id')
+    if not output_file_id:
+        raise RuntimeError("批量翻译任务完成但没有输出文件")
+
+    content_response = requests.get(
+        f"{DASHSCOPE_COMPAT_BASE}/files/{output_file_id}/content",
+        headers=headers,
+        timeout=120
+    )
+    content_response.raise_for_status()
+
+    # 结果行顺序不保证，按custom_id映射回段落索引
+    translated_by_idx = {}
+    for line in content_response.text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response_body = (record.get('response') or {}).get('body') or {}
+        choices = response_body.get('choices') or []
+        if choices:
+            translated_by_idx[int(record['custom_id'])] = choices[0]['message']['content'].strip()
+
+    translated_segments = []
+    for idx, merged_segment in enumerate(merged_segments):
+        translated_text = translated_by_idx.get(idx)
+        if translated_text:
+            # 写入翻译缓存，后续重跑或回退逐段路径时可直接命中
+            _TRANSLATE_CACHE.set(_translation_cache_key(merged_segment['text']), translated_text)
+        translated_segments.append({
+            "start": merged_segment["start"],
+            "end": merged_segment["end"],
+            "original_text": merged_segment["text"],
+            "translated_text": translated_text if translated_text else "[翻译错误: 批量任务未返回该段落结果]",
+            "original_segments": merged_segment.get("original_segments", [])
+        })
 
-    return all_translated_segments
+    print(f"批量翻译完成，成功 {len(translated_by_idx)}/{len(merged_segments)} 个段落")
+    return translated_segments
 
 
-def translate_asr_results(asr_file_path: str, api_key: Optional[str] = None, output_path: Optional[str] = None, enable_preprocessing: bool = True) -> str:
+def translate_asr_results(asr_file_path: str, api_key: Optional[str] = None, output_path: Optional[str] = None, enable_preprocessing: bool = True, use_batch_api: bool = True) -> str:
     """
     翻译ASR结果文件的主函数，增加qwen-turbo前处理步骤
 
@@ -398,6 +686,7 @@ def translate_asr_results(asr_file_path: str, api_key: Optional[str] = None, out
         api_key (Optional[str]): DashScope API密钥，如果不提供则从配置中获取
         output_path (Optional[str]): 输出文件路径，如果不指定则自动生成
         enable_preprocessing (bool): 是否启用qwen-turbo前处理，默认启用
+        use_batch_api (bool): 是否优先使用Batch API翻译（失败时自动回退逐段翻译），默认启用
 
     Returns:
         str: 翻译结果文件的路径
@@ -410,6 +699,10 @@ def translate_asr_results(asr_file_path: str, api_key: Optional[str] = None, out
         if not api_key:
             raise ValueError("未提供API密钥，请通过参数传入或设置环境变量 DASHSCOPE_API_KEY")
 
+    # 在入口处设置一次API密钥，后续所有qwen调用共享SDK内部的连接池，
+    # TLS/TCP握手在N个请求间摊销
+    dashscope.api_key = api_key
+
     # 检查输入文件是否存在
     if not os.path.exists(asr_file_path):
         raise FileNotFoundError(f"ASR结果文件不存在: {asr_file_path}")
@@ -431,13 +724,17 @@ def translate_asr_results(asr_file_path: str, api_key: Optional[str] = None, out
 
         output_path = os.path.join(asr_dir, translated_filename)
 
-    # 读取ASR结果
+    # 读取ASR结果。ijson增量解析segments数组，峰值内存是单个segment
+    # 而不是整个文件（多小时视频的ASR JSON可达数十MB）
     print("读取ASR结果...")
-    with open(asr_file_path, 'r', encoding='utf-8') as f:
-        asr_data = json.load(f)
-
-    # 提取segments
-    segments = asr_data.get('segments', [])
+    if ijson is not None:
+        with open(asr_file_path, 'rb') as f:
+            segments = list(ijson.items(f, 'segments.item'))
+    else:
+        with open(asr_file_path, 'rb') as f:
+            raw = f.read()
+        asr_data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        segments = asr_data.get('segments', [])
     if not segments:
         print("警告: ASR结果中没有找到segments")
         # 创建空的翻译结果
@@ -462,9 +759,16 @@ def translate_asr_results(asr_file_path: str, api_key: Optional[str] = None, out
             print("跳过语义合并前处理，直接翻译...")
             merged_segments = segments  # 不进行合并，直接翻译
 
-        # 第二步：翻译合并后的段落
+        # 第二步：翻译合并后的段落，优先走Batch API，失败时回退逐段并发翻译
         print("开始翻译...")
-        translated_segments = translate_merged_paragraphs(merged_segments, api_key)
+        translated_segments = None
+        if use_batch_api:
+            try:
+                translated_segments = translate_merged_paragraphs_batch(merged_segments, api_key)
+            except Exception as e:
+                print(f"Batch API翻译失败，回退到逐段并发翻译: {e}")
+        if translated_segments is None:
+            translated_segments = translate_merged_paragraphs(merged_segments, api_key)
 
         # 构建翻译结果
         translated_result = {
@@ -480,10 +784,17 @@ def translate_asr_results(asr_file_path: str, api_key: Optional[str] = None, out
             }
         }
 
-    # 保存翻译结果
+    # 保存翻译结果。原子写：先写同目录临时文件再os.replace，
+    # 中途崩溃不会留下截断的JSON让下一次运行加载失败
     print(f"保存翻译结果到: {output_path}")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(translated_result, f, ensure_ascii=False, indent=2)
+    tmp_path = output_path + '.tmp'
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(translated_result, option=orjson.OPT_INDENT_2))
+    else:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(translated_result, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
 
     print("翻译完成!")
     return output_path
@@ -500,9 +811,14 @@ def main():
     parser.add_argument('asr_file', help='ASR结果JSON文件路径')
     parser.add_argument('-o', '--output', help='输出文件路径（可选，默认使用ASR文件同目录）')
     parser.add_argument('--no-preprocessing', action='store_true', help='跳过语义合并前处理')
+    parser.add_argument('--no-batch', action='store_true', help='不使用Batch API，直接逐段并发翻译')
+    parser.add_argument('--verbose', action='store_true', help='输出每个段落/chunk的详细进度')
 
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(message)s')
+
     # 获取API密钥
     api_key = get_api_key()
     if not api_key:
@@ -511,7 +827,7 @@ def main():
 
     try:
         print(f"开始翻译ASR结果文件: {args.asr_file}")
-        output_file = translate_asr_results(args.asr_file, api_key, args.output, not args.no_preprocessing)
+        output_file = translate_asr_results(args.asr_file, api_key, args.output, not args.no_preprocessing, not args.no_batch)
         print(f"翻译结果已保存到: {output_file}")
     except Exception as e:
         print(f"翻译过程中发生错误: {e}")
@@ -1,13 +1,90 @@
 
+import functools
 import json
-import hashlib
+import logging
 import os
+import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from blake3 import blake3
 from gradio_client import Client, file as gradio_file
 
+try:
+    import ijson
+except ImportError:
+    ijson = None  # ijson未安装时回退到一次性加载
+
+logger = logging.getLogger(__name__)
+
+# TTS并发worker数：Gradio服务端支持并发请求时，多个在途请求
+# 可以把CPU侧的请求封包和GPU侧的推理流水线化
+TTS_MAX_WORKERS = 4
+
+@functools.lru_cache(maxsize=4096)
 def generate_text_hash(text):
-    """生成文本的哈希值"""
-    return hashlib.md5(text.encode('utf-8')).hexdigest()[:8]
+    """生成文本的哈希值（BLAKE3，8位十六进制，与旧的md5[:8]同宽）"""
+    return blake3(text.encode('utf-8')).hexdigest(length=4)
+
+def _generate_tts_segment(client, reference_handle, translated_text, output_path):
+    """
+    调用TTS服务生成单个段落音频并保存
+
+    Args:
+        reference_handle: 预先构建的参考音频句柄（gradio_file结果），所有段落共用
+
+    Returns:
+        tuple: (生成耗时秒数, 是否成功)
+    """
+    generation_start_time = time.time()
+
+    result = client.predict(
+        emo_control_method="与音色参考音频相同",
+        prompt=reference_handle,
+        text=translated_text,
+        emo_ref_path=None,
+        emo_weight=0.65,
+        vec1=0,
+        vec2=0,
+        vec3=0,
+        vec4=0,
+        vec5=0,
+        vec6=0,
+        vec7=0,
+        vec8=0,
+        emo_text="",
+        emo_random=False,
+        max_text_tokens_per_sentence=120,
+        param_16=True,
+        param_17=0.8,
+        param_18=30,
+        param_19=0.8,
+        param_20=0,
+        param_21=3,
+        param_22=10,
+        param_23=1815,
+        api_name="/gen_single"
+    )
+
+    generation_time = time.time() - generation_start_time
+
+    if not result:
+        return generation_time, False
+
+    # 从Gradio返回的字典中获取生成的音频文件路径，落到输出目录。
+    # Gradio临时目录和输出目录通常在同一文件系统上，硬链接是O(1)的
+    # inode操作、零字节搬运；跨设备(EXDEV)等情况回退到copyfile，
+    # Linux下走sendfile/copy_file_range，避免用户态缓冲
+    # 先落到.part再原子改名：半截的WAV不会被下一次运行的
+    # os.path.exists缓存检查当成有效文件
+    generated_audio_path = result['value']
+    part_path = output_path + '.part'
+    try:
+        os.link(generated_audio_path, part_path)
+    except OSError:
+        shutil.copyfile(generated_audio_path, part_path)
+    os.replace(part_path, output_path)
+    return generation_time, True
+
 
 def tts_from_translated_json(json_file_path, reference_audio_path, output_dir=None):
     """
@@ -26,15 +103,20 @@ def tts_from_translated_json(json_file_path, reference_audio_path, output_dir=No
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
 
-    # 读取JSON文件
-    with open(json_file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # 读取JSON文件。ijson增量解析segments数组，不把整个翻译结果文件
+    # 一次性读进内存；未安装时回退到json.load
+    if ijson is not None:
+        with open(json_file_path, 'rb') as f:
+            segments = list(ijson.items(f, 'segments.item'))
+    else:
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            segments = json.load(f)['segments']
 
     # 初始化TTS客户端
     client = Client("http://localhost:6006/")
 
     # 性能统计变量
-    total_segments = len(data['segments'])
+    total_segments = len(segments)
     total_generation_time = 0
     total_audio_duration = 0
     successful_segments = 0
@@ -49,8 +131,9 @@ def tts_from_translated_json(json_file_path, reference_audio_path, output_dir=No
     print(f"=== TTS性能统计开始 ===")
     print(f"总段落数: {total_segments}")
 
-    # 处理每个段落
-    for i, segment in enumerate(data['segments']):
+    # 第一遍：计算输出文件名，统计缓存命中，收集待生成的段落
+    pending_segments = []
+    for i, segment in enumerate(segments):
         start_time = int(segment['start'])
         end_time = int(segment['end'])
         translated_text = segment['translated_text']
@@ -67,86 +150,56 @@ def tts_from_translated_json(json_file_path, reference_audio_path, output_dir=No
         # 添加到当前任务文件列表
         current_task_files.add(output_filename)
 
-        print(f"\n处理第 {i+1}/{total_segments} 段: {start_time}-{end_time}ms")
-        print(f"音频片段长度: {segment_duration:.2f}秒")
-        print(f"翻译文本长度: {text_length} 字符")
-        print(f"文本: {translated_text[:100]}...")
-        print(f"输出文件: {output_filename}")
+        logger.info("处理第 %d/%d 段: %d-%dms", i + 1, total_segments, start_time, end_time)
+        logger.info("音频片段长度: %.2f秒, 翻译文本长度: %d 字符", segment_duration, text_length)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("文本: %s...", translated_text[:100])
+        logger.info("输出文件: %s", output_filename)
 
         # 检查文件是否已存在（缓存命中）
         if os.path.exists(output_path):
-            print(f"🎯 缓存命中: 跳过生成，使用现有文件")
+            logger.info("🎯 缓存命中: 跳过生成，使用现有文件")
             successful_segments += 1
             total_audio_duration += segment_duration
             skipped_segments += 1
-            print("-" * 60)
             continue
 
-        # 记录生成开始时间
-        generation_start_time = time.time()
-
-        try:
-            # 调用TTS服务
-            result = client.predict(
-                emo_control_method="与音色参考音频相同",
-                prompt=gradio_file(reference_audio_path),
-                text=translated_text,
-                emo_ref_path=None,
-                emo_weight=0.65,
-                vec1=0,
-                vec2=0,
-                vec3=0,
-                vec4=0,
-                vec5=0,
-                vec6=0,
-                vec7=0,
-                vec8=0,
-                emo_text="",
-                emo_random=False,
-                max_text_tokens_per_sentence=120,
-                param_16=True,
-                param_17=0.8,
-                param_18=30,
-                param_19=0.8,
-                param_20=0,
-                param_21=3,
-                param_22=10,
-                param_23=1815,
-                api_name="/gen_single"
-            )
-
-            # 记录生成结束时间
-            generation_end_time = time.time()
-            generation_time = generation_end_time - generation_start_time
-
-            # 保存结果
-            if result:
-                # 从Gradio返回的字典中获取生成的音频文件路径
-                generated_audio_path = result['value']
-
-                # 复制生成的文件到输出目录
-                import shutil
-                shutil.copy(generated_audio_path, output_path)
-
-                # 更新统计信息
-                total_generation_time += generation_time
-                total_audio_duration += segment_duration
-                successful_segments += 1
-
-                print(f"✓ 已保存: {output_filename}")
-                print(f"⏱️  生成耗时: {generation_time:.2f}秒")
-                print(f"📊 实时倍率: {segment_duration/generation_time:.2f}x (音频时长/生成时间)")
-            else:
-                print(f"✗ 生成失败: {output_filename}")
-
-        except Exception as e:
-            generation_end_time = time.time()
-            generation_time = generation_end_time - generation_start_time
-            print(f"✗ 处理段落时出错: {e}")
-            print(f"⏱️  失败段落耗时: {generation_time:.2f}秒")
-            continue
+        pending_segments.append((i, segment_duration, translated_text, output_filename, output_path))
+
+    # 第二遍：用线程池并发请求TTS服务。客户端大部分时间阻塞在网络IO上，
+    # 多个在途请求让GPU在段落之间不再空转；统计在主线程的完成循环中累加
+    if pending_segments:
+        print(f"\n开始生成 {len(pending_segments)} 个段落（{TTS_MAX_WORKERS} 个并发worker）...")
 
-        print("-" * 60)
+        # 参考音频句柄只构建一次：同一个WAV不必为每个段落重新读取/上传
+        reference_handle = gradio_file(reference_audio_path)
+
+        with ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS) as executor:
+            future_to_task = {
+                executor.submit(_generate_tts_segment, client, reference_handle,
+                                translated_text, output_path): (i, segment_duration, output_filename)
+                for i, segment_duration, translated_text, output_filename, output_path in pending_segments
+            }
+
+            for future in as_completed(future_to_task):
+                i, segment_duration, output_filename = future_to_task[future]
+                try:
+                    generation_time, ok = future.result()
+                except Exception as e:
+                    print(f"✗ 处理第 {i+1} 段时出错: {e}")
+                    continue
+
+                if ok:
+                    # 更新统计信息
+                    total_generation_time += generation_time
+                    total_audio_duration += segment_duration
+                    successful_segments += 1
+
+                    logger.info("✓ 已保存: %s (第 %d/%d 段)", output_filename, i + 1, total_segments)
+                    logger.info("⏱️  生成耗时: %.2f秒, 实时倍率: %.2fx (音频时长/生成时间)",
+                                generation_time, segment_duration / generation_time)
+                else:
+                    print(f"✗ 生成失败: {output_filename}")
 
     # 清理不需要的文件
     cleanup_unused_files(output_dir, current_task_files)
@@ -156,8 +209,8 @@ def tts_from_translated_json(json_file_path, reference_audio_path, output_dir=No
     total_process_time = process_end_time - process_start_time
 
     # 计算音频总长度（最后一个片段的end时间）
-    if data['segments']:
-        last_segment_end = int(data['segments'][-1]['end'])
+    if segments:
+        last_segment_end = int(segments[-1]['end'])
         total_asr_duration = last_segment_end / 1000.0  # 转换为秒
     else:
         total_asr_duration = 0
@@ -186,22 +239,21 @@ def cleanup_unused_files(output_dir, current_task_files):
         current_task_files: 当前任务需要的文件名集合
     """
     try:
-        # 扫描输出目录中的所有wav文件
-        existing_files = set()
-        for filename in os.listdir(output_dir):
-            if filename.endswith('.wav') and filename.startswith('tts_'):
-                existing_files.add(filename)
-
-        # 找出需要删除的文件
-        files_to_delete = existing_files - current_task_files
+        # 扫描输出目录中的所有wav文件。scandir单次系统调用惰性迭代，
+        # DirEntry自带缓存的stat信息，目录里有上千个缓存段时明显快于listdir
+        files_to_delete = {
+            entry.name: entry.path
+            for entry in os.scandir(output_dir)
+            if entry.name.startswith('tts_') and entry.name.endswith('.wav')
+            and entry.name not in current_task_files and entry.is_file()
+        }
 
         if files_to_delete:
             print(f"\n🧹 清理不需要的音频文件:")
             for filename in sorted(files_to_delete):
-                file_path = os.path.join(output_dir, filename)
                 try:
-                    os.remove(file_path)
-                    print(f"  ✗ 已删除: {filename}")
+                    os.unlink(files_to_delete[filename])
+                    logger.info("  ✗ 已删除: %s", filename)
                 except Exception as e:
                     print(f"  ⚠️  删除失败 {filename}: {e}")
             print(f"🧹 清理完成，删除了 {len(files_to_delete)} 个文件")
@@ -221,9 +273,13 @@ def main():
     parser.add_argument('json_file', help='翻译后的JSON文件路径')
     parser.add_argument('-r', '--reference-audio', default="data/ICT-ref-short.WAV", help='参考音频文件路径（默认: data/ICT-ref.WAV）')
     parser.add_argument('-o', '--output-dir', help='输出目录路径（可选，默认在JSON文件同目录下创建tts_output文件夹）')
+    parser.add_argument('--verbose', action='store_true', help='输出每个段落的详细进度（长视频下有可观的stdout开销）')
 
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(message)s')
+
     # 检查文件是否存在
     if not os.path.exists(args.json_file):
         print(f"错误: 找不到JSON文件 {args.json_file}")
@@ -1,20 +1,44 @@
 #!/usr/bin/env python3
 """
 视频合成脚本
-基于MoviePy实现视频合成功能
+直接编排ffmpeg实现视频合成功能
 """
 
 import argparse
+import functools
+import json
 import os
+import re
+import subprocess
 import sys
+import wave
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import numpy as np
+
 from typing import Optional, List, Dict
 
-os.environ["FFMPEG_BINARY"] = "/usr/bin/ffmpeg"
-os.environ["FFPLAY_BINARY"] = "/usr/bin/ffplay"
+from gpu_utils import _probe_ffmpeg_encoders
+
+# ffmpeg/ffprobe可执行文件路径，沿用之前给MoviePy用的环境变量作为覆盖入口
+FFMPEG_BIN = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BIN = os.environ.get("FFPROBE_BINARY", "ffprobe")
+
+# TTS文件名格式: tts_{start_ms}_{end_ms}_{hash}，模块级预编译，
+# 每个TTS文件在验证和编码阶段都会各解析一次
+_TTS_RE = re.compile(r'tts_(\d+)_(\d+)_([a-f0-9]+)')
+
+# 片段编码并发数：消费级NVIDIA GPU的NVENC并发编码session上限通常是3，
+# 超过会直接报错；实际编码在ffmpeg子进程里做，这里用线程池并发驱动即可
+SEGMENT_MAX_WORKERS = min(3, os.cpu_count() or 1)
 
-from moviepy import VideoFileClip, AudioFileClip, concatenate_videoclips
+# 所有分段统一的AAC音频参数。concat demuxer按第一个分段的流布局决定
+# 输出：如果间隙没有音轨（或采样率/声道与替换片段不一致），拼出来的
+# 成品要么整体无声要么音画漂移，所以替换片段和间隙静音轨都钉死同一组参数
+AUDIO_SAMPLE_RATE = 44100
+AUDIO_CHANNELS = 2
 
 def parse_arguments():
     """解析命令行参数"""
@@ -98,50 +122,61 @@ def validate_inputs(video_file: str, tts_dir: Optional[str] = None) -> bool:
     return True
 
 def find_tts_files(tts_dir: str) -> List[str]:
-    """查找TTS目录中的所有音频文件"""
+    """
+    查找TTS目录中的所有音频文件
+
+    单次os.scandir遍历目录（之前按扩展名glob了四遍），并按文件名里
+    解析出的开始时间毫秒数排序：字典序只有在时间戳零填充时才碰巧正确，
+    数值排序对未填充的时间戳也能保证时间轴顺序
+    """
     if not os.path.exists(tts_dir):
         return []
 
-    audio_extensions = ['.wav', '.mp3', '.m4a', '.aac']
-    tts_files = []
+    audio_extensions = ('.wav', '.mp3', '.m4a', '.aac')
+
+    with os.scandir(tts_dir) as it:
+        tts_files = [entry.path for entry in it
+                     if entry.is_file() and entry.name.lower().endswith(audio_extensions)]
 
-    for ext in audio_extensions:
-        tts_files.extend(Path(tts_dir).glob(f"*{ext}"))
+    def sort_key(path: str) -> int:
+        match = _TTS_RE.match(Path(path).stem)
+        return int(match.group(1)) if match else 0
 
-    # 按文件名排序
-    tts_files.sort(key=lambda x: x.name)
-    return [str(f) for f in tts_files]
+    tts_files.sort(key=sort_key)
+    return tts_files
 
-def parse_tts_filename(tts_filename: str) -> Optional[Dict]:
+# TTS文件名解析结果：不可变的namedtuple，可以安全地被lru_cache共享
+TtsInfo = namedtuple('TtsInfo', [
+    'start_time_ms',  # 开始时间（毫秒）
+    'end_time_ms',    # 结束时间（毫秒）
+    'start_time_s',   # 开始时间（秒）
+    'end_time_s',     # 结束时间（秒）
+    'duration',       # 持续时间（秒）
+    'hash'            # 文件哈希值
+])
+
+@functools.lru_cache(maxsize=4096)
+def parse_tts_filename(tts_filename: str) -> Optional[TtsInfo]:
     """
     从TTS文件名中解析出音频对应原视频的时间信息
 
     文件名格式: tts_{start_time}_{end_time}_{hash}.wav
     时间单位: 毫秒
 
+    整个管线里每个TTS文件至少在验证和编码阶段各解析一次，
+    结果按文件名lru_cache，正则匹配和int转换只做一遍
+
     Args:
         tts_filename: TTS文件名
 
     Returns:
-        包含时间信息的字典，格式：
-        {
-            'start_time_ms': int,    # 开始时间（毫秒）
-            'end_time_ms': int,      # 结束时间（毫秒）
-            'start_time_s': float,   # 开始时间（秒）
-            'end_time_s': float,     # 结束时间（秒）
-            'duration': float,       # 持续时间（秒）
-            'hash': str             # 文件哈希值
-        }
-        如果解析失败返回None
+        TtsInfo: 包含时间信息的namedtuple，解析失败返回None
     """
-    import re
-
     # 提取文件名（去掉路径和扩展名）
     filename = Path(tts_filename).stem
 
-    # 使用正则表达式匹配文件名格式
-    pattern = r'tts_(\d+)_(\d+)_([a-f0-9]+)'
-    match = re.match(pattern, filename)
+    # 使用模块级预编译的正则匹配文件名格式
+    match = _TTS_RE.match(filename)
 
     if not match:
         print(f"警告: 无法解析TTS文件名格式: {tts_filename}")
@@ -157,102 +192,440 @@ def parse_tts_filename(tts_filename: str) -> Optional[Dict]:
         end_time_s = end_time_ms / 1000.0
         duration = end_time_s - start_time_s
 
-        return {
-            'start_time_ms': start_time_ms,
-            'end_time_ms': end_time_ms,
-            'start_time_s': start_time_s,
-            'end_time_s': end_time_s,
-            'duration': duration,
-            'hash': file_hash
-        }
+        return TtsInfo(start_time_ms, end_time_ms, start_time_s, end_time_s,
+                       duration, file_hash)
 
     except (ValueError, IndexError) as e:
         print(f"警告: 解析TTS文件名时出错 {tts_filename}: {e}")
         return None
 
-def validate_time_ranges(tts_files: List[str], video_duration: float) -> List[str]:
+def validate_time_ranges(tts_files: List[str], video_duration: float,
+                         verbose: bool = False) -> List[str]:
     """
     验证TTS文件的时间范围是否在视频时长内
 
+    文件名里的时间戳一次性解析进numpy int64数组，用一个向量化比较
+    过滤全部文件，代替逐文件的Python级解析+两次float比较；
+    上千个TTS文件的目录下正则开销只付一遍，逐文件的警告打印
+    只在verbose下输出
+
     Args:
         tts_files: TTS文件列表
         video_duration: 视频总时长（秒）
+        verbose: 是否逐文件打印被跳过的原因
 
     Returns:
         过滤后的TTS文件列表（只包含时间范围有效的文件）
     """
-    valid_files = []
+    if not tts_files:
+        return []
 
-    for tts_file in tts_files:
-        time_info = parse_tts_filename(tts_file)
-        if not time_info:
-            print(f"跳过无法解析的文件: {tts_file}")
-            continue
+    matches = [_TTS_RE.match(Path(f).stem) for f in tts_files]
+    parsed_idx = [i for i, m in enumerate(matches) if m]
 
-        if time_info['start_time_s'] >= video_duration:
-            print(f"⚠️  警告: 文件 {Path(tts_file).name} 的开始时间 ({time_info['start_time_s']:.2f}s) 超过视频总时长 ({video_duration:.2f}s)，跳过")
-            continue
+    if verbose:
+        for i, m in enumerate(matches):
+            if not m:
+                print(f"跳过无法解析的文件: {tts_files[i]}")
 
-        if time_info['end_time_s'] > video_duration:
-            print(f"⚠️  警告: 文件 {Path(tts_file).name} 的结束时间 ({time_info['end_time_s']:.2f}s) 超过视频总时长 ({video_duration:.2f}s)，跳过")
-            continue
+    if not parsed_idx:
+        return []
 
-        valid_files.append(tts_file)
+    starts = np.fromiter((int(matches[i].group(1)) for i in parsed_idx),
+                         dtype=np.int64, count=len(parsed_idx))
+    ends = np.fromiter((int(matches[i].group(2)) for i in parsed_idx),
+                       dtype=np.int64, count=len(parsed_idx))
 
-    return valid_files
+    video_ms = int(video_duration * 1000)
+    mask = (starts < video_ms) & (ends <= video_ms)
 
+    if verbose:
+        for j in np.flatnonzero(~mask):
+            i = parsed_idx[j]
+            print(f"⚠️  警告: 文件 {Path(tts_files[i]).name} 的时间范围 "
+                  f"({starts[j] / 1000.0:.2f}s - {ends[j] / 1000.0:.2f}s) "
+                  f"超过视频总时长 ({video_duration:.2f}s)，跳过")
+
+    return [tts_files[parsed_idx[j]] for j in np.flatnonzero(mask)]
+
+
+# 音频时长缓存：键为(路径, mtime)，同一个TTS文件在验证和编码阶段
+# 各查一次时长，第二次直接命中，不再起ffprobe进程
+_audio_duration_cache: Dict[tuple, float] = {}
 
 def get_audio_duration(audio_file: str) -> float:
-    """获取音频文件的时长"""
+    """
+    获取音频文件的时长
+
+    WAV文件（TTS输出的常见情况）直接用标准库wave读文件头，进程内
+    一次open+read就拿到时长，零子进程开销；其他格式回退到ffprobe
+    读容器元数据。结果按(路径, mtime)缓存，文件没变就不重复探测
+    """
+    try:
+        cache_key = (audio_file, os.path.getmtime(audio_file))
+    except OSError as e:
+        print(f"警告: 无法获取音频时长 {audio_file}: {e}")
+        return 0.0
+
+    cached = _audio_duration_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if audio_file.lower().endswith('.wav'):
+        try:
+            with wave.open(audio_file, 'rb') as w:
+                duration = w.getnframes() / w.getframerate()
+            _audio_duration_cache[cache_key] = duration
+            return duration
+        except Exception:
+            pass  # 非标准WAV头，回退到ffprobe
+
     try:
-        with AudioFileClip(audio_file) as audio_clip:
-            return audio_clip.duration
+        result = subprocess.run([
+            FFPROBE_BIN, '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=nw=1:nk=1',
+            audio_file
+        ], capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            print(f"警告: ffprobe探测音频时长失败 {audio_file}: {result.stderr.strip()}")
+            return 0.0
+        duration = float(result.stdout.strip())
     except Exception as e:
         print(f"警告: 无法获取音频时长 {audio_file}: {e}")
         return 0.0
 
-def cleanup_invalid_cache(segment_dir: Path, valid_tts_files: List[str]) -> None:
+    _audio_duration_cache[cache_key] = duration
+    return duration
+
+@functools.lru_cache(maxsize=64)
+def get_video_duration(video_file: str) -> float:
+    """
+    用ffprobe读取视频时长
+
+    只读容器头部元数据，不初始化解码器，比为了一个duration
+    构造整个VideoFileClip轻量得多。同一个视频在main和合成函数里
+    都要查时长，结果按路径lru_cache，一次运行只探测一次
+    """
+    try:
+        result = subprocess.run([
+            FFPROBE_BIN, '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=nw=1:nk=1',
+            video_file
+        ], capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            print(f"警告: ffprobe探测视频时长失败 {video_file}: {result.stderr.strip()}")
+            return 0.0
+        return float(result.stdout.strip())
+    except Exception as e:
+        print(f"警告: 无法获取视频时长 {video_file}: {e}")
+        return 0.0
+
+# 硬件H.264编码器优先级及各自的快档预设，按平台常见可用性排序。
+# 只列能直接消费软件帧的编码器：vaapi/amf还需要-vaapi_device/hwupload
+# 这类额外管线，ffmpeg_segment生成的命令喂给它们必然失败，"编译进了
+# ffmpeg"不代表当前命令形态可用，选上只会让每个片段编码都报错
+_GPU_ENCODER_PREFERENCE = (
+    ('h264_nvenc', 'p1'),
+    ('h264_qsv', 'fast'),
+    ('h264_videotoolbox', 'fast'),
+)
+
+@functools.lru_cache(maxsize=2)
+def detect_encoder(prefer_gpu: bool = True) -> tuple:
     """
-    清理失效的缓存文件，只保留当前TTS文件列表中有效的片段
+    一次性检测可用的H.264编码器
+
+    复用gpu_utils缓存的`ffmpeg -encoders`探测结果，按平台优先级
+    选择硬件编码器；没有可用硬件编码器（或显式禁用GPU）时回退到
+    libx264软件编码，而不是在没有NVIDIA GPU的机器上直接报错
 
     Args:
-        segment_dir: 片段存储目录
-        valid_tts_files: 当前有效的TTS文件列表
+        prefer_gpu: 是否优先使用硬件编码器（--no-gpu时为False）
+
+    Returns:
+        tuple: (编码器名, 预设名)，如('h264_nvenc', 'p1')或('libx264', 'veryfast')
     """
-    if not segment_dir.exists():
-        return
+    if prefer_gpu:
+        try:
+            encoders = _probe_ffmpeg_encoders()
+        except Exception as e:
+            print(f"⚠️  编码器检测失败: {e}")
+            encoders = frozenset()
 
-    # 创建当前TTS文件对应的片段文件名集合
-    expected_segments = set()
-    for i, tts_file in enumerate(valid_tts_files):
-        segment_filename = f"segment_{i+1:02d}_{Path(tts_file).stem}.mp4"
-        expected_segments.add(segment_filename)
-
-    # 检查现有片段文件，删除不在期望集合中的文件
-    deleted_count = 0
-    for segment_file in segment_dir.glob("segment_*.mp4"):
-        if segment_file.name not in expected_segments:
-            try:
-                segment_file.unlink()
-                print(f"  🗑️  删除失效缓存: {segment_file.name}")
-                deleted_count += 1
-            except Exception as e:
-                print(f"  ⚠️  删除缓存文件失败 {segment_file.name}: {e}")
-
-    if deleted_count > 0:
-        print(f"  ✅ 清理完成，删除了 {deleted_count} 个失效缓存文件")
+        for codec, preset in _GPU_ENCODER_PREFERENCE:
+            if codec in encoders:
+                return codec, preset
+
+        print("⚠️  未检测到可用的硬件编码器，回退到libx264软件编码")
+
+    return 'libx264', 'veryfast'
+
+def _encoder_args(codec: str, preset: str) -> List[str]:
+    """
+    生成片段编码的编码器参数
+
+    NVENC和libx264各有一套质量参数（constqp/crf 18均接近视觉无损），
+    其他硬件编码器用通用参数
+    """
+    if codec == 'h264_nvenc':
+        # p1是NVENC吞吐最高的预设（B帧少、RD决策简单），constqp 18在
+        # 视觉上接近无损。注意这些片段经concat流复制后直接进最终文件，
+        # 所以保留正常GOP长度（24fps下约5秒一个关键帧）保证可拖动进度条
+        return ['-c:v', 'h264_nvenc', '-preset', preset, '-tune', 'll',
+                '-rc', 'constqp', '-qp', '18', '-bf', '0', '-g', '120']
+    if codec == 'libx264':
+        return ['-c:v', 'libx264', '-preset', preset, '-crf', '18',
+                '-bf', '0', '-g', '120']
+    return ['-c:v', codec, '-preset', preset, '-g', '120']
+
+# 视频流编码名 → 对应的NVDEC(cuvid)解码器
+_CUVID_DECODERS = {'h264': 'h264_cuvid', 'hevc': 'hevc_cuvid'}
+
+@functools.lru_cache(maxsize=64)
+def _probe_video_stream(video_file: str) -> tuple:
+    """用ffprobe读视频流的(codec_name, profile, pix_fmt)，探测失败返回空串"""
+    try:
+        result = subprocess.run([
+            FFPROBE_BIN, '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name,profile,pix_fmt',
+            '-of', 'json',
+            video_file
+        ], capture_output=True, text=True, timeout=30)
+        if result.returncode == 0:
+            streams = json.loads(result.stdout).get('streams') or [{}]
+            stream = streams[0]
+            return (stream.get('codec_name', ''), stream.get('profile', ''),
+                    stream.get('pix_fmt', ''))
+    except Exception:
+        pass
+    return ('', '', '')
+
+def _probe_video_codec(video_file: str) -> str:
+    """视频流编码名（h264/hevc/...），用于选择匹配的cuvid解码器"""
+    return _probe_video_stream(video_file)[0]
+
+def _source_copy_compatible(video_file: str) -> bool:
+    """
+    源视频流能否直接-c:v copy进concat列表
+
+    替换片段固定编码成h264 High yuv420p；流复制的间隙保留的是源视频
+    自己的codec/profile/SPS-PPS和B帧结构，与替换片段不一致时concat
+    流复制出来的文件解码必然出问题（HEVC源是最典型的例子）。只有
+    源参数与片段编码参数完全一致才允许流复制，否则回退重编码
+    """
+    codec_name, profile, pix_fmt = _probe_video_stream(video_file)
+    return codec_name == 'h264' and profile == 'High' and pix_fmt == 'yuv420p'
+
+def ffmpeg_segment(video_file: str, start: float, end: float, tts_file: str,
+                   speed_factor: float, out_path: str,
+                   codec: str = 'h264_nvenc', preset: str = 'p1') -> None:
+    """
+    用一条ffmpeg命令完成单个替换片段的"截取+调速+替换音频+编码"
+
+    NVENC路径下用NVDEC硬件解码原视频片段，解码帧以AV_PIX_FMT_CUDA
+    格式留在显存（-hwaccel_output_format cuda），scale_cuda在GPU上做
+    像素格式转换，setpts只改时间戳元数据，NVENC直接消费显存帧——
+    整条链路没有逐帧的host↔device PCIe拷贝（1080p下每帧约1.5MB）。
+    其他编码器走CPU解码+format滤镜的通用路径。
+    TTS音频原样映射（视频向音频对齐，音频本身不做变速）
+
+    Args:
+        video_file: 原视频文件路径
+        start: 片段开始时间（秒）
+        end: 片段结束时间（秒）
+        tts_file: TTS音频文件路径
+        speed_factor: 速度调整因子（原片段时长/音频时长）
+        out_path: 输出片段文件路径
+        codec: 视频编码器（detect_encoder的结果）
+        preset: 编码预设
+
+    Raises:
+        RuntimeError: ffmpeg返回非零退出码
+    """
+    use_nvenc = codec == 'h264_nvenc'
+
+    cmd = [FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error']
+
+    if use_nvenc:
+        # 解码帧保持在显存，不回落到系统内存
+        cmd += ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+
+        # 按源视频编码选择cuvid解码器（HEVC源用hevc_cuvid）；
+        # 未知编码时不显式指定，交给-hwaccel cuda自动协商
+        decoder = _CUVID_DECODERS.get(_probe_video_codec(video_file))
+        if decoder:
+            cmd += ['-c:v', decoder]
+
+    cmd += [
+        # -ss在-i之前：按关键帧快速定位，不逐帧解码到目标位置
+        '-ss', f'{start:.3f}', '-to', f'{end:.3f}', '-i', video_file,
+        '-i', tts_file,
+    ]
+
+    # 像素格式归一到yuv420p（concat各分段pix_fmt必须一致）：
+    # NVENC路径用scale_cuda在GPU上转，CPU路径用format滤镜；
+    # setpts只改时间戳，在硬件帧和软件帧上同样适用
+    setpts = f'setpts=(PTS-STARTPTS)/{speed_factor:.6f}'
+    if use_nvenc:
+        filtergraph = f'[0:v]scale_cuda=format=yuv420p,{setpts}[v]'
     else:
-        print(f"  ✅ 没有需要清理的失效缓存")
+        filtergraph = f'[0:v]{setpts},format=yuv420p[v]'
+
+    cmd += ['-filter_complex', filtergraph, '-map', '[v]', '-map', '1:a']
+    cmd += _encoder_args(codec, preset)
+    cmd += [
+        # concat demuxer流复制要求所有分段的codec/profile/时间基一致，
+        # 这里显式钉住，避免编码器默认值和原视频流参数不匹配
+        '-profile:v', 'high', '-level', '4.1',
+        '-video_track_timescale', '90000',
+        '-c:a', 'aac', '-ar', str(AUDIO_SAMPLE_RATE), '-ac', str(AUDIO_CHANNELS),
+        '-shortest',
+        str(out_path)
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg片段编码失败: {result.stderr.strip()}")
+
+def stream_copy_segment(video_file: str, start: float, end: float, tts_file: str,
+                        out_path: str) -> None:
+    """
+    速度因子≈1.0时的快速路径：视频既不调速也不改帧，没有理由重编码。
+    -c:v copy直接流复制原视频片段，只把TTS音频编码成AAC混入，
+    整段的NVENC编码完全省掉，耗时从计算瓶颈变成IO瓶颈。
+    代价是流复制的切点会对齐到邻近关键帧，起止可能有数十毫秒偏移
+
+    Raises:
+        RuntimeError: ffmpeg返回非零退出码
+    """
+    cmd = [
+        FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        '-ss', f'{start:.3f}', '-to', f'{end:.3f}', '-i', video_file,
+        '-i', tts_file,
+        '-map', '0:v', '-map', '1:a',
+        '-c:v', 'copy',
+        '-c:a', 'aac', '-ar', str(AUDIO_SAMPLE_RATE), '-ac', str(AUDIO_CHANNELS),
+        '-shortest',
+        '-video_track_timescale', '90000',
+        str(out_path)
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg片段流复制失败: {result.stderr.strip()}")
+
+def _load_segment_manifest(segment_dir: Path) -> Dict:
+    """读取片段缓存清单，不存在或损坏时返回空清单"""
+    manifest_path = segment_dir / "manifest.json"
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_segment_manifest(segment_dir: Path, manifest: Dict) -> None:
+    """原子写入片段缓存清单：先写.tmp再os.replace，不留半截JSON"""
+    manifest_path = segment_dir / "manifest.json"
+    tmp_path = str(manifest_path) + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        print(f"⚠️  写入缓存清单失败: {e}")
+
+def extract_gap_segment(video_file: str, start: float, end: float, out_path: str) -> None:
+    """
+    提取原视频中未被替换的间隙片段：视频流复制 + 静音AAC音轨
+
+    间隙里的视频字节不需要任何修改，-c:v copy直接搬运码流，不解码
+    也不重编码；原音轨丢弃，换成anullsrc生成的静音AAC轨——参数与
+    替换片段的音轨完全一致。不能简单-an去掉音轨：concat demuxer按
+    列表中第一个文件（几乎总是间隙）确定输出流布局，无音轨的间隙
+    会让最终成品整体丢失音频。注意-ss在-i之前按关键帧快速定位，
+    切点不在关键帧上时会被对齐到邻近关键帧
+
+    Raises:
+        RuntimeError: ffmpeg返回非零退出码
+    """
+    cmd = [
+        FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+        '-ss', f'{start:.3f}', '-i', video_file,
+        '-f', 'lavfi', '-i', f'anullsrc=r={AUDIO_SAMPLE_RATE}:cl={AUDIO_CHANNELS}c',
+        '-to', f'{end - start:.3f}',
+        '-map', '0:v', '-map', '1:a',
+        '-c:v', 'copy',
+        '-c:a', 'aac', '-ar', str(AUDIO_SAMPLE_RATE), '-ac', str(AUDIO_CHANNELS),
+        # 与替换片段使用同一时间基，concat demuxer才能无缝衔接时间戳
+        '-video_track_timescale', '90000',
+        str(out_path)
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg间隙提取失败: {result.stderr.strip()}")
+
+def encode_gap_segment(video_file: str, start: float, end: float, out_path: str,
+                       codec: str = 'h264_nvenc', preset: str = 'p1') -> None:
+    """
+    源视频流参数与替换片段不一致时的间隙回退路径：重编码成相同参数
+
+    与ffmpeg_segment走同一条NVDEC→NVENC链路和同一组编码参数，只是
+    不调速、音轨换成静音AAC。比流复制慢，但保证concat列表里所有
+    分段的codec/profile/pix_fmt/时间基一致，-c copy拼接才是安全的
+
+    Raises:
+        RuntimeError: ffmpeg返回非零退出码
+    """
+    use_nvenc = codec == 'h264_nvenc'
+
+    cmd = [FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error']
+
+    if use_nvenc:
+        cmd += ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+        decoder = _CUVID_DECODERS.get(_probe_video_codec(video_file))
+        if decoder:
+            cmd += ['-c:v', decoder]
+
+    cmd += [
+        '-ss', f'{start:.3f}', '-to', f'{end:.3f}', '-i', video_file,
+        '-f', 'lavfi', '-i', f'anullsrc=r={AUDIO_SAMPLE_RATE}:cl={AUDIO_CHANNELS}c',
+    ]
+
+    if use_nvenc:
+        filtergraph = '[0:v]scale_cuda=format=yuv420p,setpts=PTS-STARTPTS[v]'
+    else:
+        filtergraph = '[0:v]setpts=PTS-STARTPTS,format=yuv420p[v]'
+
+    cmd += ['-filter_complex', filtergraph, '-map', '[v]', '-map', '1:a']
+    cmd += _encoder_args(codec, preset)
+    cmd += [
+        '-profile:v', 'high', '-level', '4.1',
+        '-video_track_timescale', '90000',
+        '-c:a', 'aac', '-ar', str(AUDIO_SAMPLE_RATE), '-ac', str(AUDIO_CHANNELS),
+        '-shortest',
+        str(out_path)
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg间隙重编码失败: {result.stderr.strip()}")
 
 def synthesize_video_with_tts(video_file: str, tts_dir: str, output_file: str, use_gpu: bool = False, debug_export: bool = False):
     """
     使用TTS音频合成视频 - 根据音频时长动态调整视频片段速度
 
+    片段阶段完全由ffmpeg承担：每个替换片段通过一次NVDEC→setpts→NVENC
+    调用直接编码成文件，不经过MoviePy的Python帧迭代。拼接阶段把
+    原视频静音片段和编码好的替换片段合并后一次性写出
+
     Args:
         video_file: 原视频文件路径
         tts_dir: TTS音频文件目录路径
         output_file: 输出视频文件路径
-        debug_export: 是否导出每个片段用于调试
+        debug_export: 是否保留每个替换片段文件用于调试
 
     Returns:
         bool: 是否成功
@@ -267,260 +640,218 @@ def synthesize_video_with_tts(video_file: str, tts_dir: str, output_file: str, u
     print(f"TTS文件数量: {len(tts_files)}")
     print(f"输出文件: {output_file}")
 
-    # 加载原视频
-    with VideoFileClip(video_file) as video_clip:
-        video_duration = video_clip.duration
-        print(f"原视频时长: {video_duration:.2f}s")
+    # 一次性选定编码器：有硬件编码器就用，没有（或--no-gpu）回退libx264
+    codec, preset = detect_encoder(prefer_gpu=use_gpu)
+    print(f"视频编码器: {codec} (preset={preset})")
+
+    # 源视频流参数决定流复制路径是否可用：与片段编码参数不一致时
+    # （HEVC源、非High profile、非yuv420p），间隙回退重编码，
+    # 速度≈1.0的片段也不再走-c:v copy快速路径
+    source_copyable = _source_copy_compatible(video_file)
+    if not source_copyable:
+        codec_name, profile, pix_fmt = _probe_video_stream(video_file)
+        print(f"⚠️  源视频流({codec_name or '?'}/{profile or '?'}/{pix_fmt or '?'})"
+              f"与片段编码参数(h264/High/yuv420p)不一致，间隙与等速片段将重编码")
+
+    # 片段阶段只需要视频时长，用ffprobe读元数据即可，不构造VideoFileClip
+    video_duration = get_video_duration(video_file)
+    if video_duration <= 0:
+        print("❌ 无法获取原视频时长")
+        return False
+    print(f"原视频时长: {video_duration:.2f}s")
 
-        # 验证TTS文件的时间范围
-        valid_tts_files = validate_time_ranges(tts_files, video_duration)
-        print(f"过滤后的有效TTS文件: {len(valid_tts_files)} 个")
+    # 验证TTS文件的时间范围
+    valid_tts_files = validate_time_ranges(tts_files, video_duration)
+    print(f"过滤后的有效TTS文件: {len(valid_tts_files)} 个")
 
-        if not valid_tts_files:
-            print("❌ 没有有效的TTS文件")
-            return False
+    if not valid_tts_files:
+        print("❌ 没有有效的TTS文件")
+        return False
 
-        output_path = Path(output_file)
-        segment_dir = output_path.parent / "segments"
+    output_path = Path(output_file)
+    segment_dir = output_path.parent / "segments"
+    segment_dir.mkdir(exist_ok=True)
 
-        # 删除整个segments目录以清除所有缓存
-        if segment_dir.exists():
-            print(f"🗑️  删除现有segments目录: {segment_dir}")
-            import shutil
-            try:
-                shutil.rmtree(segment_dir)
-                print(f"✅ 已删除segments目录及其所有内容")
-            except Exception as e:
-                print(f"⚠️  删除segments目录失败: {e}")
+    # 片段缓存清单：按"内容哈希_起点_终点"寻址。文件名里的哈希只标识
+    # TTS文本内容，重复文本（片头片尾、免责声明）会在不同时间点出现，
+    # 单用哈希做键会让这些片段互相覆盖、甚至复用从错误时间段截出的画面；
+    # 键里带上时间范围后，配合tts_mtime和speed_factor校验，编辑过的TTS
+    # 会被重新编码，而不是被"文件存在且非空"这种检查当成有效缓存
+    manifest = _load_segment_manifest(segment_dir)
 
-        # 创建新的segments目录
-        segment_dir.mkdir(exist_ok=True)
-        print(f"📁 创建新的segments目录: {segment_dir}")
+    # 第一步：准备编码任务，缓存命中的片段直接复用
+    encode_tasks = []
+    encoded_segments = []
+    cache_hits = 0
 
-        for i, tts_file in enumerate(valid_tts_files):
-            print(f"\n📁 处理第 {i+1}/{len(valid_tts_files)} 个TTS文件: {Path(tts_file).name}")
+    for i, tts_file in enumerate(valid_tts_files):
+        # 每轮只构造一次Path对象，name/stem在循环体内复用
+        tts_path = Path(tts_file)
+        print(f"\n📁 准备第 {i+1}/{len(valid_tts_files)} 个TTS文件: {tts_path.name}")
 
-            # 解析TTS文件名中的时间信息
-            time_info = parse_tts_filename(tts_file)
-            if not time_info:
-                print(f"跳过无法解析的文件: {tts_file}")
-                continue
+        # 解析TTS文件名中的时间信息
+        time_info = parse_tts_filename(tts_file)
+        if not time_info:
+            print(f"跳过无法解析的文件: {tts_file}")
+            continue
 
-            # 获取TTS音频时长
-            tts_duration = get_audio_duration(tts_file)
-            if tts_duration <= 0:
-                print(f"跳过无效的音频文件: {tts_file}")
-                continue
+        # 获取TTS音频时长
+        tts_duration = get_audio_duration(tts_file)
+        if tts_duration <= 0:
+            print(f"跳过无效的音频文件: {tts_file}")
+            continue
 
-            print(f"  📽️  原视频片段: {time_info['start_time_s']:.2f}s - {time_info['end_time_s']:.2f}s (时长: {time_info['duration']:.2f}s)")
-            print(f"  🔊 TTS音频时长: {tts_duration:.2f}s")
+        print(f"  📽️  原视频片段: {time_info.start_time_s:.2f}s - {time_info.end_time_s:.2f}s (时长: {time_info.duration:.2f}s)")
+        print(f"  🔊 TTS音频时长: {tts_duration:.2f}s")
+
+        # 计算速度调整因子：原视频片段时长 / 音频时长
+        speed_factor = time_info.duration / tts_duration
+        print(f"  ⚙️  速度调整因子: {speed_factor:.2f}x")
+
+        # 缓存校验：键命中 + TTS文件未被改动 + 调速因子一致 + 片段文件完好
+        tts_mtime = os.path.getmtime(tts_file)
+        manifest_key = f"{time_info.hash}_{time_info.start_time_ms}_{time_info.end_time_ms}"
+        entry = manifest.get(manifest_key)
+        if entry is not None:
+            cached_path = Path(entry.get('seg_path', ''))
+            if (entry.get('tts_mtime') == tts_mtime
+                    and abs(entry.get('speed_factor', 0.0) - speed_factor) <= 1e-3
+                    and cached_path.exists() and cached_path.stat().st_size > 0):
+                print(f"  🎯 缓存命中: 复用片段 {cached_path.name}")
+                encoded_segments.append((time_info.start_time_s, time_info.end_time_s, cached_path))
+                cache_hits += 1
+                continue
 
-            # 提取对应的视频片段
-            video_segment = video_clip.subclipped(time_info['start_time_s'], time_info['end_time_s'])
+        segment_filename = f"segment_{i+1:02d}_{tts_path.stem}.mp4"
+        segment_path = segment_dir / segment_filename
 
-            # 计算速度调整因子：音频时长 / 原视频片段时长
-            speed_factor = time_info['duration'] / tts_duration
-            print(f"  ⚙️  速度调整因子: {speed_factor:.2f}x")
+        encode_tasks.append((time_info.start_time_s, time_info.end_time_s,
+                             tts_file, speed_factor, segment_path, manifest_key, tts_mtime))
 
-            if speed_factor > 1.0:
-                print(f"      🚀 原视频片段比音频长，需要加速 {speed_factor:.2f}x")
-            elif speed_factor < 1.0:
-                print(f"      🐌 原视频片段比音频短，需要减速到 {speed_factor:.2f}x 原速度")
-            else:
-                print(f"      ✅ 原视频片段时长与音频匹配，无需调速")
+    if not encode_tasks and not encoded_segments:
+        print(f"❌ 没有可编码的替换片段")
+        return False
 
-            # 调整视频速度以匹配TTS音频时长
-            if abs(speed_factor - 1.0) > 0.01:  # 只有在速度差异较大时才调整
-                adjusted_segment = video_segment.with_speed_scaled(speed_factor)
-                print(f"      ✨ 视频片段已调整至 {adjusted_segment.duration:.2f}s")
-            else:
-                adjusted_segment = video_segment
-                print(f"      ✨ 视频片段保持原时长 {adjusted_segment.duration:.2f}s")
-
-            # 加载TTS音频
-            try:
-                tts_audio = AudioFileClip(tts_file)
-                print(f"      🔊 TTS音频加载成功，时长: {tts_audio.duration:.2f}s，采样率: {tts_audio.fps}Hz")
-
-                # 确保音频时长与调整后的视频时长完全匹配
-                if abs(tts_audio.duration - adjusted_segment.duration) > 0.1:
-                    # 微调音频时长以匹配视频
-                    tts_audio = tts_audio.with_duration(adjusted_segment.duration)
-                    print(f"      ✂️  音频时长已微调至 {tts_audio.duration:.2f}s")
-
-                # 将音频设置到视频片段上
-                final_segment = adjusted_segment.with_audio(tts_audio)
-
-                # 检查音频是否成功附加
-                if final_segment.audio is not None:
-                    print(f"      ✅ 音频成功附加到视频片段，音频时长: {final_segment.audio.duration:.2f}s")
+    if cache_hits:
+        print(f"\n🎯 缓存命中 {cache_hits}/{len(valid_tts_files)} 个片段")
+
+    # 并发编码替换片段：每个任务是一条独立的ffmpeg命令，互不依赖，
+    # 并发跑满NVENC的编码session，串行时GPU在片段之间完全空转
+    if encode_tasks:
+        print(f"\n⚙️  开始并发编码 {len(encode_tasks)} 个替换片段（{SEGMENT_MAX_WORKERS} 个并发worker）...")
+
+        with ThreadPoolExecutor(max_workers=SEGMENT_MAX_WORKERS) as executor:
+            future_to_task = {}
+            for seg_start, seg_end, tts_file, speed_factor, segment_path, manifest_key, tts_mtime in encode_tasks:
+                # 时长本来就匹配且源流参数兼容的片段走流复制快速路径，
+                # 跳过NVENC重编码
+                if abs(speed_factor - 1.0) <= 0.01 and source_copyable:
+                    future = executor.submit(stream_copy_segment, video_file, seg_start,
+                                             seg_end, tts_file, str(segment_path))
                 else:
-                    print(f"      ❌ 警告：音频附加失败，视频片段无音频轨道")
-
-                # 导出带音频的视频片段到磁盘（必须写入磁盘，否则后续合成会丢失音频）
-                segment_filename = f"segment_{i+1:02d}_{Path(tts_file).stem}.mp4"
-                segment_path = segment_dir / segment_filename
-
+                    future = executor.submit(ffmpeg_segment, video_file, seg_start,
+                                             seg_end, tts_file, speed_factor, str(segment_path),
+                                             codec, preset)
+                future_to_task[future] = (seg_start, seg_end, segment_path, speed_factor,
+                                          manifest_key, tts_mtime)
+
+            for future in as_completed(future_to_task):
+                seg_start, seg_end, segment_path, speed_factor, manifest_key, tts_mtime = future_to_task[future]
                 try:
-                    final_segment.write_videofile(
-                        str(segment_path),
-                        fps=24,
-                        codec="h264_nvenc",
-                        preset="fast",
-                        audio=True,
-                        pixel_format="yuv420p"
-                    )
-                    print(f"      ✅ 视频片段导出成功: {segment_path}")
-                except Exception as export_error:
-                    print(f"      ❌ 视频片段导出失败: {export_error}")
+                    future.result()
+                except Exception as e:
+                    print(f"  ❌ 视频片段导出失败 {segment_path.name}: {e}")
                     continue
+                print(f"  ✅ 视频片段导出成功: {segment_path}")
+                encoded_segments.append((seg_start, seg_end, segment_path))
+                manifest[manifest_key] = {
+                    'tts_mtime': tts_mtime,
+                    'seg_path': str(segment_path),
+                    'speed_factor': speed_factor
+                }
+
+        # 编码全部完成后原子落盘，下次运行据此复用片段
+        _save_segment_manifest(segment_dir, manifest)
+
+    if not encoded_segments:
+        print(f"❌ 没有成功编码任何替换片段")
+        return False
 
-                tts_audio.close()
-
-            except Exception as e:
-                print(f"      ❌ 处理TTS文件时出错: {e}")
-                continue
-
-        # 清理视频片段内存
-        video_segment.close()
-        if 'adjusted_segment' in locals():
-            adjusted_segment.close()
-        if 'final_segment' in locals():
-            final_segment.close()
+    # 按时间顺序排序片段
+    encoded_segments.sort(key=lambda s: s[0])
+    print(f"\n✅ 成功编码 {len(encoded_segments)} 个替换片段")
 
-    # 第二步：用保存的片段替换原视频对应部分
-    print(f"\n🎬 第二步：用保存的片段替换原视频对应部分")
+    # 第二步：提取间隙片段并用concat demuxer拼接成最终视频。
+    # 间隙的视频流是原视频自己的字节，-c:v copy搬运，只重新混入
+    # 静音AAC轨；只有TTS替换片段经过了视频重编码。TTS覆盖不到一半
+    # 时间轴时，绝大部分编码工作就此省掉，间隙画质也与原视频逐比特一致
+    print(f"\n🔗 开始创建最终视频...")
 
-    # 重新加载原视频
     try:
-        with VideoFileClip(video_file) as original_video:
-            video_duration = original_video.duration
-            print(f"📹 原视频时长: {video_duration:.2f}s")
-
-            # 查找所有导出的视频片段文件
-            segment_files = sorted(segment_dir.glob("segment_*.mp4"))
-
-            if not segment_files:
-                print(f"❌ 没有找到导出的视频片段文件")
-                return False
-
-            print(f"📁 找到 {len(segment_files)} 个视频片段文件")
-
-            # 解析每个片段的时间信息并加载
-            segments_info = []
-            import re
-            for seg_file in segment_files:
-                try:
-                    # 从文件名提取TTS文件名：segment_XX_tts_12345678_12345678_hash.mp4
-                    match = re.match(r"segment_\d+_(tts_\d+_\d+_[a-f0-9]+)\.mp4", seg_file.name)
-                    if match:
-                        tts_filename = match.group(1)
-                        time_info = parse_tts_filename(tts_filename + ".wav")
-                        if time_info:
-                            clip = VideoFileClip(str(seg_file))
-                            segments_info.append({
-                                'clip': clip,
-                                'start_time': time_info['start_time_s'],
-                                'end_time': time_info['end_time_s'],
-                                'duration': clip.duration,
-                                'file': seg_file
-                            })
-                            print(f"  📹 加载片段: {seg_file.name}")
-                            print(f"     📽️  替换时间: {time_info['start_time_s']:.2f}s - {time_info['end_time_s']:.2f}s")
-                            print(f"     🎵 片段时长: {clip.duration:.2f}s")
-                except Exception as e:
-                    print(f"  ❌ 处理片段失败 {seg_file.name}: {e}")
-                    continue
-
-            if not segments_info:
-                print(f"❌ 没有成功加载任何视频片段")
-                return False
-
-            # 按时间顺序排序片段
-            segments_info.sort(key=lambda x: x['start_time'])
-            print(f"✅ 成功加载 {len(segments_info)} 个有效片段")
-
-            # 创建最终视频：原视频片段 + 替换的音频片段
-            print(f"\n🔗 开始创建最终视频...")
-
-            # 构建最终的片段列表
-            final_clips = []
-            current_time = 0
-
-            for seg_info in segments_info:
-                seg_start = seg_info['start_time']
-                seg_end = seg_info['end_time']
-
-                # 添加当前片段之前的原视频部分（静音处理）
-                if current_time < seg_start:
-                    original_part = original_video.subclipped(current_time, seg_start)
-                    # 静音处理：移除原视频的音频
-                    original_part = original_part.without_audio()
-                    final_clips.append(original_part)
-                    print(f"  ➕ 添加原视频片段（已静音）: {current_time:.2f}s - {seg_start:.2f}s")
-
-                # 添加带新音频的片段（替换原视频的对应部分）
-                # 确保片段没有alpha通道问题，设置背景色为黑色
-                if hasattr(seg_info['clip'], 'mask') and seg_info['clip'].mask is not None:
-                    seg_clip = seg_info['clip']
-                    seg_clip = seg_clip.without_audio()  # 先移除音频
-                    seg_clip = seg_clip.with_mask(False)  # 移除mask，会填充黑色背景
-                    seg_clip = seg_clip.with_audio(seg_info['clip'].audio)  # 重新添加音频
-                    final_clips.append(seg_clip)
+        parts = []
+        current_time = 0.0
+        gap_index = 0
+
+        for seg_start, seg_end, segment_path in encoded_segments:
+            # 提取当前片段之前的原视频部分（视频流复制，静音音轨）
+            if current_time < seg_start:
+                gap_path = segment_dir / f"gap_{gap_index:02d}.mp4"
+                if source_copyable:
+                    extract_gap_segment(video_file, current_time, seg_start, str(gap_path))
                 else:
-                    final_clips.append(seg_info['clip'])
-                print(f"  🔄 替换原视频片段: {seg_start:.2f}s - {seg_end:.2f}s (新片段时长: {seg_info['duration']:.2f}s)")
-
-                current_time = seg_end
-
-            # 添加最后一个片段之后的所有原视频内容（静音处理）
-            if current_time < video_duration:
-                remaining_part = original_video.subclipped(current_time, video_duration)
-                # 静音处理：移除原视频的音频
-                remaining_part = remaining_part.without_audio()
-                final_clips.append(remaining_part)
-                print(f"  ➕ 添加剩余原视频（已静音）: {current_time:.2f}s - {video_duration:.2f}s")
-
-            # 合并所有片段
-            final_video = concatenate_videoclips(final_clips)
-            print(f"✅ 视频片段替换完成，最终视频时长: {final_video.duration:.2f}s")
-
-            # 导出最终视频
-            print(f"📤 开始导出最终视频: {output_file}")
-            final_video.write_videofile(
-                output_file,
-                codec="h264_nvenc",
-                preset="fast",
-                fps=24,
-                audio=True,
-                pixel_format="yuv420p"
-            )
-
-            final_video.close()
-
-            # 清理内存
-            for clip in final_clips:
-                try:
-                    clip.close()
-                except:
-                    pass
-
-            for seg_info in segments_info:
-                try:
-                    seg_info['clip'].close()
-                except:
-                    pass
-
-            print(f"✅ 最终视频替换成功: {output_file}")
-
-            # 清理失效的缓存文件
-            if not debug_export:
-                print(f"\n🧹 清理失效的缓存文件...")
-                cleanup_invalid_cache(segment_dir, valid_tts_files)
+                    encode_gap_segment(video_file, current_time, seg_start, str(gap_path),
+                                       codec, preset)
+                parts.append(gap_path)
+                gap_index += 1
+                print(f"  ➕ 添加原视频片段（{'视频流复制' if source_copyable else '重编码'}，静音音轨）: {current_time:.2f}s - {seg_start:.2f}s")
+
+            # 添加带新音频的片段（替换原视频的对应部分）
+            parts.append(segment_path)
+            print(f"  🔄 替换原视频片段: {seg_start:.2f}s - {seg_end:.2f}s")
+
+            current_time = seg_end
+
+        # 提取最后一个片段之后的所有原视频内容（视频流复制，静音音轨）
+        if current_time < video_duration:
+            gap_path = segment_dir / f"gap_{gap_index:02d}.mp4"
+            if source_copyable:
+                extract_gap_segment(video_file, current_time, video_duration, str(gap_path))
             else:
-                print(f"\n💾 调试模式：保留所有片段文件: {segment_dir}")
-
-            return True
+                encode_gap_segment(video_file, current_time, video_duration, str(gap_path),
+                                   codec, preset)
+            parts.append(gap_path)
+            print(f"  ➕ 添加剩余原视频（{'视频流复制' if source_copyable else '重编码'}，静音音轨）: {current_time:.2f}s - {video_duration:.2f}s")
+
+        # 写concat列表（绝对路径配合-safe 0），用concat demuxer流复制拼接，
+        # 最终视频不再经过任何一次整体重编码
+        concat_list_path = segment_dir / "concat_list.txt"
+        with open(concat_list_path, 'w', encoding='utf-8') as f:
+            for part in parts:
+                f.write(f"file '{Path(part).resolve()}'\n")
+
+        print(f"📤 开始导出最终视频: {output_file}")
+        concat_cmd = [
+            FFMPEG_BIN, '-y', '-hide_banner', '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0', '-i', str(concat_list_path),
+            '-c', 'copy',
+            output_file
+        ]
+        result = subprocess.run(concat_cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"concat拼接失败: {result.stderr.strip()}")
+
+        print(f"✅ 最终视频替换成功: {output_file}")
+
+        # 只清理间隙文件和concat列表；片段文件和清单保留作为跨运行缓存
+        if not debug_export:
+            print(f"\n🧹 清理间隙临时文件...")
+            for gap_file in segment_dir.glob("gap_*.mp4"):
+                gap_file.unlink(missing_ok=True)
+            concat_list_path.unlink(missing_ok=True)
+        else:
+            print(f"\n💾 调试模式：保留所有临时文件: {segment_dir}")
+
+        return True
 
     except Exception as e:
         print(f"❌ 视频片段替换时出错: {e}")
@@ -548,18 +879,16 @@ def main():
     print(f"找到 {len(tts_files)} 个TTS文件")
 
     # 获取视频时长并验证TTS文件的时间范围
-    try:
-        with VideoFileClip(args.video_file) as video_clip:
-            video_duration = video_clip.duration
-            print(f"视频时长: {video_duration:.2f}s")
-
-            # 验证TTS文件时间范围
-            valid_tts_files = validate_time_ranges(tts_files, video_duration)
-            tts_files = valid_tts_files
-            print(f"时间范围验证后的有效TTS文件: {len(tts_files)} 个")
+    video_duration = get_video_duration(args.video_file)
+    if video_duration > 0:
+        print(f"视频时长: {video_duration:.2f}s")
 
-    except Exception as e:
-        print(f"警告: 无法获取视频时长: {e}")
+        # 验证TTS文件时间范围
+        valid_tts_files = validate_time_ranges(tts_files, video_duration)
+        tts_files = valid_tts_files
+        print(f"时间范围验证后的有效TTS文件: {len(tts_files)} 个")
+    else:
+        print(f"警告: 无法获取视频时长: {args.video_file}")
 
     # 显示TTS文件解析信息（用于调试）
     if tts_files:
@@ -568,9 +897,9 @@ def main():
             time_info = parse_tts_filename(tts_file)
             audio_duration = get_audio_duration(tts_file)
             if time_info:
-                speed_factor = time_info['duration'] / audio_duration if audio_duration > 0 else 0
+                speed_factor = time_info.duration / audio_duration if audio_duration > 0 else 0
                 print(f"  {i+1}. {Path(tts_file).name}")
-                print(f"     📽️  原视频时间: {time_info['start_time_s']:.2f}s - {time_info['end_time_s']:.2f}s (片段时长: {time_info['duration']:.2f}s)")
+                print(f"     📽️  原视频时间: {time_info.start_time_s:.2f}s - {time_info.end_time_s:.2f}s (片段时长: {time_info.duration:.2f}s)")
                 print(f"     🔊 音频时长: {audio_duration:.2f}s")
                 print(f"     ⚙️  需要调速: {speed_factor:.2f}x ({'加速' if speed_factor > 1 else '减速' if speed_factor < 1 else '无需调速'})")
         if len(tts_files) > 5: